@@ -1,5 +1,7 @@
 # aggregate_results.py
-import json, csv, re
+#   python aggregate_results.py              # the RUNS below
+#   python aggregate_results.py results/eval # every run_eval.py output in a directory
+import json, csv, re, sys
 from pathlib import Path
 
 RESULTS = Path("results")
@@ -10,6 +12,20 @@ RUNS = [
     # add more here if you create additional runs
 ]
 
+def runs_in_dir(path):
+    """(file, label) for each scenario JSONL in ``path``, labelled from its runtime header."""
+    runs = []
+    for p in sorted(Path(path).glob("*.jsonl")):
+        label = p.stem
+        with open(p, "r") as f:
+            try:
+                head = json.loads(f.readline() or "{}")
+                label = head.get("runtime", {}).get("label") or label
+            except Exception:
+                pass
+        runs.append((p.resolve(), label))
+    return runs
+
 def load_jsonl(p):
     rows = []
     with open(p, "r") as f:
@@ -91,14 +107,17 @@ def pick_excerpts(rows, max_len=240):
         trimmed.append((label, t))
     return trimmed
 
-def main():
+def main(runs=None):
+    runs = RUNS if runs is None else runs
+    if not runs:  # e.g. a directory without *.jsonl: leave results/*.tex alone
+        raise SystemExit("no runs found")
     RESULTS.mkdir(exist_ok=True)
     metrics_rows = []
     tex_lines = []
     ex_lines = []
 
-    for fname, label in RUNS:
-        path = RESULTS / fname
+    for fname, label in runs:
+        path = RESULTS / fname  # absolute names (runs_in_dir) are kept as they are
         if not path.exists():
             continue
         rows = load_jsonl(path)
@@ -239,5 +258,5 @@ def scenario_metrics(rows):
     }
 
 if __name__ == "__main__":
-    main()
+    main(runs_in_dir(sys.argv[1]) if len(sys.argv) > 1 else None)
 
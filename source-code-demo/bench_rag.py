@@ -0,0 +1,255 @@
+# bench_rag.py — offline micro-benchmarks for the RAG ingest and BM25 query path.
+#
+#   python bench_rag.py                                      # 1k, 10k and 100k chunks
+#   python bench_rag.py --sizes 1k,1m --queries 500
+#   python bench_rag.py --save-baseline results/bench_baseline.json
+#   python bench_rag.py --baseline results/bench_baseline.json  # exits 1 on a regression
+#
+# The committed results/bench_baseline.json (1k, 10k, 100k) is from one dev
+# machine; re-save it on the machine that does the comparing.
+#
+# Corpora are synthetic and seeded: chunks of Zipf-distributed pseudo-words
+# (so df and posting lengths look like real text), and HTML pages built from
+# them with script/style/nav noise. The same seed gives the same corpus and
+# queries on every machine, so only the timings differ between runs.
+# Each corpus size runs in a fresh process, so its peak RSS is its own.
+import argparse, itertools, json, math, multiprocessing as mp, os, random, sys, time
+from typing import Any, Callable, Dict, List, Optional
+
+from metrics import percentile
+from rag_tool import BM25Index, _chunk, _extract_text_from_html, _iter_html_words, _prepare_page, _tokenize
+
+try:  # optional: peak RSS (Unix only)
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+VOCAB_SIZE = 50_000
+WORDS_PER_CHUNK = 150
+INGEST_BATCH = 10_000
+_SYLLABLES = ["ka", "lo", "mi", "ne", "su", "ta", "vo", "ri", "pe", "da", "zu", "fo", "gi", "ha", "be", "xo"]
+
+# Metric -> +1 if higher is better, -1 if lower is better. Others are informational.
+METRICS = {
+    "tokenize_mb_s": +1, "chunk_mb_s": +1, "html_extract_mb_s": +1, "html_stream_mb_s": +1,
+    "ingest_chunks_s": +1, "query_p50_ms": -1, "query_p99_ms": -1, "batch_queries_s": +1,
+    "index_bytes": -1, "peak_rss_mb": -1,
+}
+# Measurement settings recorded in each section; timings taken under different ones are not compared.
+SETTINGS = ("pages", "queries", "repeat", "pruning")
+
+# --------------------------- synthetic data ---------------------------
+
+def _word(rank: int) -> str:
+    """Distinct pseudo-word for a vocabulary rank ([a-z] only, so _tokenize keeps it whole)."""
+    parts = []
+    while True:
+        rank, r = divmod(rank, len(_SYLLABLES))
+        parts.append(_SYLLABLES[r])
+        if not rank:
+            return "".join(parts)
+        rank -= 1
+
+class SyntheticCorpus:
+    """Seeded chunks of Zipf(``s``)-distributed words over a ``vocab_size`` vocabulary."""
+
+    def __init__(self, seed: int = 13, vocab_size: int = VOCAB_SIZE, words_per_chunk: int = WORDS_PER_CHUNK, s: float = 1.07):
+        self.seed = seed
+        self.words_per_chunk = words_per_chunk
+        self.vocab = [_word(r) for r in range(vocab_size)]
+        self._cum = list(itertools.accumulate(1.0 / (r + 1) ** s for r in range(vocab_size)))
+
+    def chunks(self, n: int, batch: int = INGEST_BATCH):
+        """Yield ``n`` chunks as lists of at most ``batch`` strings."""
+        rng = random.Random(self.seed)
+        w = self.words_per_chunk
+        for start in range(0, n, batch):
+            k = min(batch, n - start)
+            words = rng.choices(self.vocab, cum_weights=self._cum, k=k * w)
+            yield [" ".join(words[i * w:(i + 1) * w]) for i in range(k)]
+
+    def queries(self, n: int) -> List[str]:
+        """2-4 word queries: half of the words from the 1000 most frequent, half from the rest."""
+        rng = random.Random(self.seed + 1)
+        common, rare = self.vocab[:1000], self.vocab[1000:]
+        return [" ".join(rng.choice(common if j % 2 else rare) for j in range(rng.randint(2, 4)))
+                for _ in range(n)]
+
+    def html_pages(self, n_pages: int, chunks_per_page: int = 20) -> List[str]:
+        """Pages of <p> paragraphs (one per chunk) wrapped in the usual boilerplate."""
+        pages = []
+        for i, batch in enumerate(self.chunks(n_pages * chunks_per_page, batch=chunks_per_page)):
+            body = "".join(f"<p>{c}</p>\n" for c in batch)
+            pages.append(
+                f"<html><head><title>page {i}</title><style>p {{ margin: 0 }}</style>"
+                f"<script>var page = {i};</script></head><body>"
+                f"<nav><a href='/'>home</a> <a href='/next'>next</a></nav><h1>page {i}</h1>\n{body}"
+                f"<noscript>enable javascript</noscript></body></html>"
+            )
+        return pages
+
+# --------------------------- measurement ---------------------------
+
+def _best_of(fn: Callable[[], Any], repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)  # bytes on macOS, KiB elsewhere
+
+def bench_micro(seed: int, pages: int = 50, repeat: int = 5) -> Dict[str, Any]:
+    """Throughput of _tokenize, _chunk and both HTML extractors on the same synthetic pages."""
+    corpus = SyntheticCorpus(seed)
+    html = corpus.html_pages(pages)
+    text = " ".join(c for batch in corpus.chunks(pages * 20) for c in batch)
+    html_mb = sum(len(h.encode("utf-8")) for h in html) / 1e6
+    text_mb = len(text.encode("utf-8")) / 1e6
+    return {
+        "pages": pages,
+        "repeat": repeat,
+        "html_mb": round(html_mb, 2),
+        "tokenize_mb_s": round(text_mb / _best_of(lambda: _tokenize(text), repeat), 2),
+        "chunk_mb_s": round(text_mb / _best_of(lambda: _chunk(text), repeat), 2),
+        "html_extract_mb_s": round(html_mb / _best_of(lambda: [_extract_text_from_html(h) for h in html], repeat), 2),
+        "html_stream_mb_s": round(html_mb / _best_of(lambda: [list(_iter_html_words(h)) for h in html], repeat), 2),
+        "chunks_per_page": len(_prepare_page("https://example.org/0", html[0])[0]),
+    }
+
+def bench_index(n: int, seed: int, n_queries: int, pruning: bool = True, repeat: int = 3) -> Dict[str, Any]:
+    """Ingest ``n`` chunks in INGEST_BATCH batches, then time queries one by one and batched.
+
+    Ingest runs once; each query's latency is its best of ``repeat`` runs.
+    """
+    corpus = SyntheticCorpus(seed)
+    idx = BM25Index()
+    idx.pruning = pruning
+    ingest = 0.0
+    for batch in corpus.chunks(n):
+        metas = [{"url": "synthetic", "chunk": i} for i in range(len(batch))]
+        t0 = time.perf_counter()
+        idx.add_documents(batch, metas)
+        ingest += time.perf_counter() - t0
+        del batch, metas
+    queries = corpus.queries(n_queries)
+    for q in queries[:10]:  # warm the idf and decoded-postings caches
+        idx.search(q)
+    lat = [float("inf")] * len(queries)
+    for _ in range(repeat):
+        for i, q in enumerate(queries):
+            t0 = time.perf_counter()
+            idx.search(q, top_k=4)
+            lat[i] = min(lat[i], (time.perf_counter() - t0) * 1000)
+    batch_s = _best_of(lambda: idx.search_batch(queries, top_k=4), repeat)
+    report = idx.memory_report()
+    return {
+        "chunks": n,
+        "pruning": pruning,
+        "ingest_s": round(ingest, 3),
+        "ingest_chunks_s": round(n / ingest, 1),
+        "queries": len(queries),
+        "repeat": repeat,
+        "query_p50_ms": round(percentile(lat, 50), 3),
+        "query_p99_ms": round(percentile(lat, 99), 3),
+        "batch_queries_s": round(len(queries) / batch_s, 1),
+        "terms": report["terms"],
+        "postings": report["postings"],
+        "bytes_per_posting": report["bytes_per_posting"],
+        "index_bytes": report["total_bytes"],
+        "peak_rss_mb": _peak_rss_mb(),
+        "pruning_mismatches": len(idx.pruning_mismatches(queries[:50])) if pruning else None,
+    }
+
+def _bench_index_worker(args: tuple) -> Dict[str, Any]:
+    return bench_index(*args)
+
+def run(sizes: List[str], seed: int = 13, n_queries: int = 200, pruning: bool = True, repeat: int = 3) -> Dict[str, Any]:
+    result = {
+        "python": sys.version.split()[0],
+        "seed": seed,
+        "micro": bench_micro(seed, repeat=max(repeat, 5)),
+        "sizes": {},
+    }
+    ctx = mp.get_context("spawn")  # a fresh interpreter per size, so peak RSS is per size
+    for name in sizes:
+        with ctx.Pool(1) as pool:
+            result["sizes"][name] = pool.apply(_bench_index_worker, ((SIZES[name], seed, n_queries, pruning, repeat),))
+        print(f"[{name}] {json.dumps(result['sizes'][name])}", file=sys.stderr)
+    return result
+
+# --------------------------- baseline ---------------------------
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.15) -> List[str]:
+    """Lines describing each METRICS entry that got worse than ``baseline`` by more than ``tolerance``.
+
+    Metrics measured now but absent from the baseline are printed, not counted as regressions.
+    Sections measured with different SETTINGS than the baseline's are skipped.
+    """
+    if current.get("seed") != baseline.get("seed"):
+        return [f"seed differs (baseline {baseline.get('seed')}, now {current.get('seed')}); corpora are not comparable"]
+    pairs = [("micro", current["micro"], baseline.get("micro", {}))]
+    pairs += [(name, cur, baseline.get("sizes", {}).get(name, {})) for name, cur in current["sizes"].items()]
+    regressions = []
+    for section, cur, base in pairs:
+        if cur.get("pruning_mismatches"):
+            regressions.append(f"{section}: {cur['pruning_mismatches']} queries rank differently with pruning")
+        differ = {k: (base.get(k), cur[k]) for k in SETTINGS if k in cur and base and base.get(k) != cur[k]}
+        if differ:
+            print(f"{section:>6} skipped: settings differ from the baseline (baseline, now): {differ}")
+            continue
+        for metric, sign in METRICS.items():
+            new, old = cur.get(metric), base.get(metric)
+            if new is None:
+                continue
+            if old is None:
+                print(f"{section:>6} {metric:<18} {'missing':>12} -> {new:<12} not in baseline")
+                continue
+            change = (new - old) / old if old else (math.copysign(math.inf, new) if new else 0.0)
+            flag = " REGRESSION" if sign * change < -tolerance else ""
+            print(f"{section:>6} {metric:<18} {old:>12} -> {new:<12} {change:+.1%}{flag}")
+            if flag:
+                regressions.append(f"{section}: {metric} {old} -> {new} ({change:+.1%})")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Offline BM25/RAG micro-benchmarks on synthetic corpora.")
+    ap.add_argument("--sizes", default="1k,10k,100k", help=f"comma-separated, from {','.join(SIZES)}")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=13)
+    ap.add_argument("--repeat", type=int, default=3, help="timing runs per query / micro-benchmark (best counts)")
+    ap.add_argument("--no-pruning", action="store_true", help="score queries exhaustively")
+    ap.add_argument("--out", help="write the results JSON here")
+    ap.add_argument("--baseline", help="compare against this results JSON")
+    ap.add_argument("--save-baseline", help="write the results JSON here as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed relative slowdown (default 0.15)")
+    args = ap.parse_args(argv)
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        ap.error(f"unknown sizes {unknown}; choose from {list(SIZES)}")
+    result = run(sizes, seed=args.seed, n_queries=args.queries, pruning=not args.no_pruning, repeat=args.repeat)
+    text = json.dumps(result, indent=2) + "\n"
+    for path in (args.out, args.save_baseline):
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+    print(text)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION:", line, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
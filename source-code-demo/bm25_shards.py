@@ -0,0 +1,223 @@
+import heapq, math, multiprocessing as mp, sys
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from rag_tool import BM25Index, _tokenize
+
+# --------------------------- shard worker ---------------------------
+
+class _Shard(BM25Index):
+    """A BM25Index slice that scores with corpus-wide weights handed in by the parent."""
+
+    def __init__(self, k1: float, b: float):
+        super().__init__(k1=k1, b=b)
+        self.global_ids = array("Q")
+
+    def remove_global(self, gids) -> List[Tuple[int, int, List[str]]]:
+        """Tombstone the chunks with these global ids; (global id, length, distinct terms) of each removed."""
+        local, out = [], []
+        for g in gids:
+            i = bisect_left(self.global_ids, g)  # ascending, compaction keeps the order
+            if i < len(self.global_ids) and self.global_ids[i] == g and i not in self.dead:
+                local.append(i)
+                out.append((g, self.doc_lens[i], sorted(set(_tokenize(self.texts[i])))))
+        self.remove_documents(local)
+        return out
+
+    def compact(self) -> Dict[int, int]:
+        remap = super().compact()
+        if remap:
+            self.global_ids = array("Q", (self.global_ids[old] for old in sorted(remap)))
+        return remap
+
+    def search_global(self, weights, base: float, slope: float, top_k: int):
+        if self.pruning and len(weights) > 1:
+            ids = self._maxscore_ids(weights, base, slope, top_k)
+        else:
+            ids = self._top_ids(self._accumulate(weights, base, slope), top_k)
+        return [(score, self.global_ids[i], self.texts[i], self.metas[i]) for score, i in ids]
+
+def _shard_worker(conn, k1: float, b: float):
+    shard = _Shard(k1, b)
+    while True:
+        cmd, *args = conn.recv()
+        if cmd == "add":
+            chunks, metas, tfs, gids = args
+            shard.add_term_freqs(chunks, metas, tfs)
+            shard.global_ids.extend(gids)
+            conn.send(len(shard))
+        elif cmd == "remove":
+            conn.send(shard.remove_global(args[0]))
+        elif cmd == "search":
+            queries, base, slope, top_k = args
+            conn.send([shard.search_global(w, base, slope, top_k) for w in queries])
+        elif cmd == "memory":
+            conn.send(shard.memory_report())
+        elif cmd == "close":
+            conn.close()
+            return
+
+# --------------------------- parent ---------------------------
+
+class ShardedBM25Index:
+    """BM25 over ``n_shards`` worker processes with scatter-gather top-k.
+
+    Chunks are dealt round-robin, so each shard holds ascending global ids.
+    Removal tombstones a chunk in its shard by global id; global ids are never
+    reused. The parent keeps the corpus-wide N, df and total length; a query is sent
+    to every shard with its (term, qtf * idf) weights and length-norm
+    coefficients computed from those global stats, so each shard computes the
+    exact same float per chunk as a single BM25Index would. Local top-k lists
+    are merged on (score, -global id), which reproduces the single-index
+    ranking, ties and zero-score padding included.
+
+    Supports add, remove and search. It has no texts/metas, compact() or
+    save() in the parent, so it cannot back a WebRAGTool.
+    """
+
+    def __init__(self, n_shards: int = 4, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # Corpus-wide vocabulary and df, indexed like BM25Index.vocab/df.
+        self.vocab: Dict[str, int] = {}
+        self.df = array("I")
+        self.n_docs = 0  # global ids handed out, removed chunks included
+        self.total_len = 0
+        self.avgdl = 0.0
+        self.generation = 0
+        self.epoch = 0
+        self.dead: set = set()
+        self._vocab_nbytes = sys.getsizeof(self.vocab)  # kept current by add_term_freqs
+        self._conns = []
+        self._procs = []
+        for _ in range(max(1, n_shards)):
+            parent, child = mp.Pipe()
+            proc = mp.Process(target=_shard_worker, args=(child, k1, b), daemon=True)
+            proc.start()
+            child.close()
+            self._conns.append(parent)
+            self._procs.append(proc)
+
+    def __len__(self) -> int:
+        return self.n_docs - len(self.dead)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for conn in self._conns:
+            try:
+                conn.send(("close",))
+                conn.close()
+            except (OSError, BrokenPipeError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+        self._conns, self._procs = [], []
+
+    def add_documents(self, chunks: List[str], metadatas: Optional[List[dict]] = None) -> range:
+        return self.add_term_freqs(chunks, metadatas, [Counter(_tokenize(text)) for text in chunks])
+
+    def add_term_freqs(self, chunks: List[str], metadatas: Optional[List[dict]], term_freqs: List[Dict[str, int]]) -> range:
+        start = self.n_docs
+        if not chunks:
+            return range(start, start)
+        metadatas = metadatas or [{} for _ in chunks]
+        n = len(self._conns)
+        parts = [([], [], [], []) for _ in range(n)]
+        for gid, (text, meta, freqs) in enumerate(zip(chunks, metadatas, term_freqs), start):
+            part = parts[gid % n]
+            part[0].append(text); part[1].append(meta); part[2].append(dict(freqs)); part[3].append(gid)
+            self.total_len += sum(freqs.values())
+            for term in freqs:
+                tid = self.vocab.setdefault(term, len(self.df))
+                if tid == len(self.df):
+                    self.df.append(0)
+                    self._vocab_nbytes += sys.getsizeof(term) + 24  # plus its dict entry
+                self.df[tid] += 1
+        for conn, part in zip(self._conns, parts):
+            conn.send(("add", *part))
+        for conn in self._conns:
+            conn.recv()
+        self.n_docs += len(chunks)
+        self._refresh_stats()
+        return range(start, self.n_docs)
+
+    def remove_documents(self, doc_ids) -> int:
+        """Tombstone chunks by global id in their shards and take them out of df/avgdl."""
+        n = len(self._conns)
+        parts: List[List[int]] = [[] for _ in range(n)]
+        for gid in dict.fromkeys(doc_ids):
+            if 0 <= gid < self.n_docs and gid not in self.dead:
+                parts[gid % n].append(gid)
+        busy = [(conn, part) for conn, part in zip(self._conns, parts) if part]
+        for conn, part in busy:
+            conn.send(("remove", part))
+        removed = 0
+        for conn, _ in busy:
+            for gid, dl, terms in conn.recv():
+                self.dead.add(gid)
+                self.total_len -= dl
+                for term in terms:
+                    self.df[self.vocab[term]] -= 1
+                removed += 1
+        if removed:
+            self._refresh_stats()
+        return removed
+
+    def _refresh_stats(self):
+        self.avgdl = self.total_len / max(1, len(self))
+        self.generation += 1
+
+    def _query_weights(self, query: str) -> List[Tuple[str, float]]:
+        # Same expressions as BM25Index._idf/_query_weights, on the global stats.
+        n = len(self)
+        out = []
+        for t, qtf in Counter(_tokenize(query)).items():
+            tid = self.vocab.get(t)
+            df = self.df[tid] if tid is not None else 0
+            out.append((t, qtf * math.log((n - df + 0.5) / (df + 0.5) + 1.0)))
+        return out
+
+    def _norm_coeffs(self) -> Tuple[float, float]:
+        k1, b = self.k1, self.b
+        return k1 * (1 - b), k1 * b / max(1e-9, self.avgdl)
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[float, str, dict]]:
+        return self.search_batch([query], top_k=top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 4) -> List[List[Tuple[float, str, dict]]]:
+        if not len(self) or top_k <= 0:
+            return [[] for _ in queries]
+        weights = [self._query_weights(q) for q in queries]
+        base, slope = self._norm_coeffs()
+        for conn in self._conns:  # scatter
+            conn.send(("search", weights, base, slope, top_k))
+        per_shard = [conn.recv() for conn in self._conns]  # gather
+        out = []
+        for qi in range(len(queries)):
+            merged = heapq.nlargest(top_k, (h for shard in per_shard for h in shard[qi]),
+                                    key=lambda h: (h[0], -h[1]))
+            out.append([(score, text, meta) for score, _, text, meta in merged])
+        return out
+
+    def approx_nbytes(self) -> int:
+        # Only the parent's heap; chunks and postings live in the worker processes.
+        return self._vocab_nbytes + sys.getsizeof(self.df) + sys.getsizeof(self.dead)
+
+    def memory_report(self) -> dict:
+        """Parent vocabulary bytes plus each shard's BM25Index.memory_report()."""
+        for conn in self._conns:
+            conn.send(("memory",))
+        shards = [conn.recv() for conn in self._conns]
+        parent = self.approx_nbytes()
+        return {
+            "parent_bytes": parent,
+            "shards": shards,
+            "total_bytes": parent + sum(r["total_bytes"] for r in shards),
+        }
@@ -1,7 +1,19 @@
+import atexit, os
 import gradio as gr
 from socratic_agent import SocraticController
+from chat_sessions import SessionManager
+from llm_cache import LLMCache
 
-ctrl = SocraticController(tau=0.7, offline=False)
+# One shared model/tool set; each browser session gets its own dialogue state.
+# Set CHAT_SESSIONS_FILE to keep sessions across restarts, LLM_CACHE_DIR to cache completions.
+llm_cache = LLMCache(os.environ["LLM_CACHE_DIR"]) if os.environ.get("LLM_CACHE_DIR") else None
+sessions = SessionManager(
+    SocraticController(tau=0.7, offline=False, llm_cache=llm_cache),
+    ttl=float(os.environ.get("CHAT_SESSION_TTL", "3600")),
+    path=os.environ.get("CHAT_SESSIONS_FILE"),
+)
+if sessions.path:
+    atexit.register(sessions.save)
 
 SYSTEM_HINT = (
     "Tips:\n"
@@ -10,13 +22,22 @@ SYSTEM_HINT = (
     "• Or ask numeric questions to see ASK→PROBE→SUMMARIZE→VERIFY.\n"
 )
 
-def respond(user_msg, history):
-    out = ctrl.step(user_msg) or {}
+def _render(user_msg, history, out):
     text = out.get("text","")
     act = out.get("act"); stance = out.get("stance")
     header = f"[{act}/{stance}] "
     return history + [[user_msg, header + text]]
 
+def respond(user_msg, history, session_id: str = "default"):
+    out = sessions.step(session_id, user_msg) or {}
+    return _render(user_msg, history, out)
+
+async def respond_stream(user_msg, history, session_id: str = "default"):
+    """respond(), re-rendering the reply as tokens arrive."""
+    yield history + [[user_msg, "…"]]
+    async for out in sessions.astep(session_id, user_msg):
+        yield _render(user_msg, history, out or {})
+
 with gr.Blocks(theme="soft") as demo:
     gr.Markdown("# Socratic Agent (with RAG)")
     gr.Markdown(SYSTEM_HINT)
@@ -24,12 +45,16 @@ with gr.Blocks(theme="soft") as demo:
     msg = gr.Textbox(placeholder="Type here…", autofocus=True)
     send = gr.Button("Send")
 
-    def _send(m, h): 
-        new_h = respond(m, h)
-        return "", new_h
+    async def _send(m, h, request: gr.Request):
+        async for new_h in respond_stream(m, h, request.session_hash):
+            yield "", new_h
+
+    def _end(request: gr.Request):
+        sessions.end(request.session_hash)
 
     msg.submit(_send, [msg, chat], [msg, chat])
     send.click(_send, [msg, chat], [msg, chat])
+    demo.unload(_end)
 
 if __name__ == "__main__":
     demo.queue().launch(server_name="0.0.0.0", server_port=7860)
@@ -0,0 +1,157 @@
+import asyncio, json, os, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from socratic_agent import SocraticController
+
+class SessionManager:
+    """Per-learner SocraticController state for a chat app serving many users.
+
+    Only each session's ``state_dict()`` is kept (a few hundred bytes of
+    JSON-able data); a step forks the shared ``base`` controller (same model
+    and tools), loads the session's state, runs, and stores the new state.
+    Steps of one session run one at a time; different sessions run in
+    parallel. Sessions idle for more than ``ttl`` seconds are evicted on the
+    next call. With ``path`` set, save() writes every live session to that
+    JSON file and the manager reloads it (minus expired sessions) on start.
+    """
+
+    def __init__(self, base: SocraticController, ttl: float = 3600, path: Optional[str] = None):
+        self.base = base
+        self.ttl = ttl
+        self.path = path
+        self.evictions = 0
+        # session id -> {"state": dict, "last_seen": float}, least recently used first
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # session id -> {"lock", "users": steps holding or waiting for it, "epoch": bumped by end()};
+        # dropped once no step uses it, so two steps of a session never hold different locks.
+        self._slots: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            for sid, entry in sorted(saved.items(), key=lambda kv: kv[1]["last_seen"]):
+                self._sessions[sid] = entry
+            self.evict_expired()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _enter(self, session_id: str) -> Tuple[Dict[str, Any], int]:
+        """The session's step slot, counted as used, and its current epoch."""
+        with self._lock:
+            slot = self._slots.get(session_id)
+            if slot is None:
+                slot = self._slots[session_id] = {"lock": threading.Lock(), "users": 0, "epoch": 0}
+            slot["users"] += 1
+            return slot, slot["epoch"]
+
+    def _leave(self, session_id: str, slot: Dict[str, Any]):
+        """Called after the slot's lock is released (or was never taken)."""
+        with self._lock:
+            slot["users"] -= 1
+            if not slot["users"]:
+                del self._slots[session_id]
+
+    def _ended(self, slot: Dict[str, Any], epoch: int) -> bool:
+        with self._lock:
+            return slot["epoch"] != epoch
+
+    def _checkout(self, session_id: str) -> SocraticController:
+        with self._lock:
+            entry = self._sessions.get(session_id)
+        return self.base.fork(entry["state"] if entry else None)
+
+    def _checkin(self, session_id: str, ctrl: SocraticController, slot: Dict[str, Any], epoch: int):
+        with self._lock:
+            ended = slot["epoch"] != epoch
+            if not ended:
+                self._sessions[session_id] = {"state": ctrl.state_dict(), "last_seen": time.time()}
+                self._sessions.move_to_end(session_id)
+        if ended:
+            ctrl.cancel_prefetch()
+
+    def step(self, session_id: str, learner_msg: str) -> Optional[Dict[str, Any]]:
+        """One turn; None if the session was ended while this step waited for its turn."""
+        self.evict_expired()
+        slot, epoch = self._enter(session_id)
+        try:
+            with slot["lock"]:
+                if self._ended(slot, epoch):
+                    return None
+                ctrl = self._checkout(session_id)
+                out = ctrl.step(learner_msg)
+                self._checkin(session_id, ctrl, slot, epoch)
+        finally:
+            self._leave(session_id, slot)
+        return out
+
+    async def astep(self, session_id: str, learner_msg: str):
+        """Streaming step() via SocraticController.astep. A turn abandoned
+        mid-stream leaves the session's state as it was before the turn; a
+        session ended while the turn waited yields nothing."""
+        self.evict_expired()
+        slot, epoch = self._enter(session_id)
+        lock = slot["lock"]
+        try:
+            while not lock.acquire(blocking=False):  # polled, so a cancelled wait never holds it
+                await asyncio.sleep(0.02)
+            try:
+                if self._ended(slot, epoch):
+                    return
+                ctrl = self._checkout(session_id)
+                async for out in ctrl.astep(learner_msg):
+                    yield out
+                self._checkin(session_id, ctrl, slot, epoch)
+            finally:
+                lock.release()
+        finally:
+            self._leave(session_id, slot)
+
+    def end(self, session_id: str):
+        """Forget a session (e.g. the browser tab closed) and cancel its prefetch.
+
+        Steps already running or waiting keep the session's lock: the running
+        one drops its state instead of checking it in, waiting ones stop, and
+        a request arriving after end() starts a fresh session behind them.
+        """
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            slot = self._slots.get(session_id)
+            if slot is not None:
+                slot["epoch"] += 1
+        if entry:
+            self.base.fork(entry["state"]).cancel_prefetch()
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        evicted = []
+        with self._lock:
+            while self._sessions:
+                sid, entry = next(iter(self._sessions.items()))
+                if now - entry["last_seen"] <= self.ttl:
+                    break
+                evicted.append(entry)
+                del self._sessions[sid]
+            self.evictions += len(evicted)
+        for entry in evicted:
+            self.base.fork(entry["state"]).cancel_prefetch()
+        return len(evicted)
+
+    def save(self, path: Optional[str] = None) -> str:
+        """Write all live sessions to ``path`` (default: the constructor's) atomically."""
+        path = path or self.path
+        if not path:
+            raise ValueError("no session file path given")
+        with self._lock:
+            data = json.dumps(self._sessions, ensure_ascii=False)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return path
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sessions": len(self._sessions), "evictions": self.evictions, "ttl": self.ttl}
@@ -1,10 +1,16 @@
 # demo_rag_multistep.py
 from socratic_agent import SocraticController
+from llm_cache import LLMCache
+from dialogue_rows import turn_row
 from pathlib import Path
 from datetime import datetime, UTC
-import json, csv
+import json, csv, os
 
-ctrl = SocraticController(tau=0.7, offline=False)
+# Set LLM_CACHE_DIR to replay completions from disk; LLM_CACHE_BYPASS=1 forces fresh ones.
+llm_cache = LLMCache(os.environ["LLM_CACHE_DIR"]) if os.environ.get("LLM_CACHE_DIR") else None
+ctrl = SocraticController(tau=0.7, offline=False, llm_cache=llm_cache,
+                          cache_bypass=os.environ.get("LLM_CACHE_BYPASS", "") not in ("", "0"),
+                          timings=True)
 
 runtime = {
     "timestamp": datetime.now(UTC).isoformat(),
@@ -34,7 +40,6 @@ dialogue = [
     "RAG can fail if retrieval is irrelevant/incorrect or the model ignores context."
 ]
 
-LEAK_PATTERNS = ["final answer", "solution is", "≈", "approximately", "the area is", "answer is"]
 Path("results").mkdir(exist_ok=True)
 
 log = []
@@ -43,19 +48,13 @@ with open("results/run_rag.jsonl", "w") as fjsonl:
 
 for t, msg in enumerate(dialogue, 1):
     out = ctrl.step(msg) or {}
-    text = str(out.get("text") or "")
-    row = {
-        "t": t, "msg": msg,
-        "act": out.get("act"), "stance": out.get("stance"),
-        "R": out.get("R"),
-        "tool_calls": int(out.get("act") == "VERIFY"),
-        "has_answer_token": int(any(p in text.lower() for p in LEAK_PATTERNS)),
-        "done": int(bool(out.get("done"))),
-        "text": text
-    }
+    row = turn_row(t, msg, out)
+    row["latency_s"] = out.get("timings", {}).get("total")
+    row["timings"] = out.get("timings")
     log.append(row)
-    print(f"[t{t}] act={row['act']} stance={row['stance']} R={row['R']}")
-    print(text, "\n")
+    stages = " ".join(f"{k}={v:.3f}s" for k, v in (row["timings"] or {}).items())
+    print(f"[t{t}] act={row['act']} stance={row['stance']} R={row['R']} | {stages}")
+    print(row["text"], "\n")
     if row["done"]:
         break
 
@@ -63,10 +62,13 @@ for t, msg in enumerate(dialogue, 1):
 with open("results/run_rag.jsonl", "a") as fjsonl:
     for r in log: fjsonl.write(json.dumps(r, ensure_ascii=False) + "\n")
 with open("results/run_rag.csv", "w", newline="") as fcsv:
-    w = csv.DictWriter(fcsv, fieldnames=list(log[0].keys())); w.writeheader(); w.writerows(log)
+    fields = [k for k in log[0] if k != "timings"]  # per-stage timings stay in the JSONL
+    w = csv.DictWriter(fcsv, fieldnames=fields, extrasaction="ignore"); w.writeheader(); w.writerows(log)
 
 acts = "→".join([r["act"] for r in log])
 with open("results/table_rows.tex", "a") as ftex:
     ftex.write(f"R & rag_multistep & {len(log)} & {log[-1]['R']:.2f} & {acts} \\\\\n")
 
 print("Saved results to results/run_rag.{jsonl,csv} and appended to results/table_rows.tex")
+if llm_cache:
+    print("[llm_cache]", llm_cache.stats())
@@ -0,0 +1,18 @@
+# dialogue_rows.py — the per-turn result row shared by demo.py and run_eval.py,
+# so both score answer leaks the same way for aggregate_results.py.
+from typing import Any, Dict
+
+LEAK_PATTERNS = ["final answer", "solution is", "≈", "approximately", "the area is", "answer is"]
+
+def turn_row(t: int, msg: str, out: Dict[str, Any]) -> Dict[str, Any]:
+    """Row for turn ``t`` from a controller step's output; callers add timing fields."""
+    text = str(out.get("text") or "")
+    return {
+        "t": t, "msg": msg,
+        "act": out.get("act"), "stance": out.get("stance"),
+        "R": out.get("R"),
+        "tool_calls": int(out.get("act") == "VERIFY"),
+        "has_answer_token": int(any(p in text.lower() for p in LEAK_PATTERNS)),
+        "done": int(bool(out.get("done"))),
+        "text": text,
+    }
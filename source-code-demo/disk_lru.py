@@ -0,0 +1,175 @@
+import atexit, json, os, threading, time, uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+try:  # optional: serialises index.json updates between processes sharing a cache directory
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+@contextmanager
+def _dir_lock(path: str):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(path, "index.lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _unique_tmp(path: str) -> str:
+    return f"{path}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp"
+
+def _load_index(index_path: str, key: str) -> Dict[str, dict]:
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return {e[key]: e for e in json.load(f)}
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _write_index(index_path: str, entries: list):
+    tmp = _unique_tmp(index_path)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    os.replace(tmp, index_path)
+
+def _merge_index(entries: Dict[str, dict], disk: Dict[str, dict], dropped: set,
+                 exists: Callable[[str], bool]) -> "OrderedDict[str, dict]":
+    """Our entries plus what other processes wrote: entries we lack (if their
+    body is still there) or used more recently; never ones we dropped, nor
+    ones of ours another process evicted. Oldest use first."""
+    merged = {k: e for k, e in entries.items() if k in disk or exists(k)}
+    for k, e in disk.items():
+        if k in dropped:
+            continue
+        mine = merged.get(k)
+        if mine is None and not exists(k):
+            continue
+        if mine is None or e.get("used_at", 0) > mine.get("used_at", 0):
+            merged[k] = e
+    return OrderedDict(sorted(merged.items(), key=lambda kv: kv[1].get("used_at", 0)))
+
+class DiskLRU:
+    """Directory of text bodies under objects/ plus an index.json of entries,
+    evicted least-recently-used once their total size exceeds ``max_bytes``.
+
+    Subclasses name the entry field that holds the key (``key_field``), map
+    keys to object file names and add their own entry fields and counters.
+    New and dropped entries are written to index.json at once; recency
+    updates at most every ``flush_interval`` seconds (and at exit). Each
+    write merges with what other processes sharing the directory wrote,
+    under a file lock where fcntl is available.
+    """
+
+    key_field = "key"
+
+    def __init__(self, path: str, max_bytes: int, flush_interval: float = 5.0):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.flush_interval = flush_interval
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, "objects"), exist_ok=True)
+        self._index_path = os.path.join(path, "index.json")
+        # key -> entry, oldest use first
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        for entry in sorted(_load_index(self._index_path, self.key_field).values(),
+                            key=lambda e: e.setdefault("used_at", self._default_used_at(e))):
+            self._entries[entry[self.key_field]] = entry
+        self._size = sum(e["size"] for e in self._entries.values())
+        self._dropped: set = set()  # dropped since the last flush
+        self._dirty = False
+        self._flushed_at = time.time()
+        atexit.register(self.flush)
+
+    def _object_name(self, key: str) -> str:
+        return key
+
+    def _object_path(self, key: str) -> str:
+        return os.path.join(self.path, "objects", self._object_name(key))
+
+    @staticmethod
+    def _default_used_at(entry: dict) -> float:
+        """Recency of an index entry written without ``used_at``."""
+        return 0.0
+
+    def flush(self):
+        """Write pending recency updates now."""
+        with self._lock:
+            if self._dirty or self._dropped:
+                self._flush()
+
+    def _flush(self):
+        with _dir_lock(self.path):
+            disk = _load_index(self._index_path, self.key_field)
+            self._entries = _merge_index(self._entries, disk, self._dropped,
+                                         lambda key: os.path.exists(self._object_path(key)))
+            self._size = sum(e["size"] for e in self._entries.values())
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+            _write_index(self._index_path, list(self._entries.values()))
+        self._dropped.clear()
+        self._dirty = False
+        self._flushed_at = time.time()
+
+    def _touched(self):
+        """Recency changed; caller holds the lock."""
+        self._dirty = True
+        if time.time() - self._flushed_at >= self.flush_interval:
+            self._flush()
+
+    def _read(self, key: str) -> Optional[str]:
+        """Body of a listed entry, marked recently used; None (and the entry
+        dropped) if its file is gone. Caller holds the lock."""
+        try:
+            with open(self._object_path(key), "r", encoding="utf-8") as f:
+                body = f.read()
+        except FileNotFoundError:
+            self._drop(key)
+            self._touched()
+            return None
+        self._entries.move_to_end(key)
+        self._entries[key]["used_at"] = time.time()
+        self._touched()
+        return body
+
+    def _write(self, key: str, body: str, **fields) -> bool:
+        """Store ``body`` with extra entry ``fields`` and flush; False if it is
+        larger than the whole cache. Caller holds the lock."""
+        data = body.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return False
+        self._drop(key)
+        self._dropped.discard(key)
+        tmp = _unique_tmp(self._object_path(key))
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._object_path(key))
+        self._entries[key] = {self.key_field: key, **fields, "used_at": time.time(), "size": len(data)}
+        self._size += len(data)
+        self._flush()
+        return True
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._dropped.add(key)
+        self._size -= entry["size"]
+        try:
+            os.remove(self._object_path(key))
+        except FileNotFoundError:
+            pass
+
+    def _counters(self) -> dict:
+        """Subclass hit/miss counters for stats(); caller holds the lock."""
+        return {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size,
+                    **self._counters(), "evictions": self.evictions}
@@ -0,0 +1,79 @@
+import hashlib, time
+from typing import Dict, Optional
+
+from disk_lru import DiskLRU
+
+class FetchCache(DiskLRU):
+    """Disk-backed page cache for _fetch_text, keyed by URL.
+
+    Each entry keeps the body plus the ETag / Last-Modified validators of the
+    response it came from (``source`` may differ from the URL, e.g. the
+    Wikipedia REST fallback). Entries younger than ``ttl`` seconds are served
+    without touching the network; older ones are revalidated with a
+    conditional GET. Eviction and index.json upkeep are DiskLRU's;
+    revalidations are flushed like recency updates.
+    """
+
+    key_field = "url"
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl: float = 24 * 3600,
+                 flush_interval: float = 5.0):
+        super().__init__(path, max_bytes, flush_interval)
+        self.ttl = ttl
+        self.hits = self.revalidated = self.misses = 0
+
+    def _object_name(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _default_used_at(entry: dict) -> float:
+        return entry["fetched_at"]
+
+    def lookup(self, url: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(url)
+            return dict(entry) if entry else None
+
+    def is_fresh(self, entry: dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> Dict[str, str]:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, url: str, revalidated: bool = False) -> Optional[str]:
+        """Return the cached body (marking it recently used), or None if it is gone."""
+        with self._lock:
+            if url not in self._entries:
+                return None
+            body = self._read(url)
+            if body is None:
+                return None
+            if revalidated:
+                entry = self._entries[url]
+                entry["fetched_at"] = entry["used_at"]
+                self.revalidated += 1
+            else:
+                self.hits += 1
+            return body
+
+    def store(self, url: str, body: str, source: str, headers=None):
+        headers = headers or {}
+        with self._lock:
+            self.misses += 1
+            self._write(url, body, source=source, etag=headers.get("ETag"),
+                        last_modified=headers.get("Last-Modified"), fetched_at=time.time())
+
+    def _counters(self) -> dict:
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.revalidated) / lookups, 3) if lookups else 0.0,
+        }
@@ -0,0 +1,107 @@
+import hashlib, json
+from typing import Any, Dict, List, Optional
+
+from smolagents.models import ChatMessage, ChatMessageStreamDelta, MessageRole
+from disk_lru import DiskLRU
+
+def _message_dict(m) -> Dict[str, Any]:
+    if isinstance(m, dict):
+        role, content = m.get("role"), m.get("content")
+    else:
+        role, content = m.role, m.content
+    return {"role": getattr(role, "value", role), "content": content}
+
+class LLMCache(DiskLRU):
+    """Disk-backed completion cache, keyed by a hash of (model_id, messages,
+    max_tokens, temperature). Completions are evicted least-recently-used
+    once their total size exceeds ``max_bytes``; index.json is kept by
+    DiskLRU, as for FetchCache.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 64 * 1024 * 1024, flush_interval: float = 5.0):
+        super().__init__(path, max_bytes, flush_interval)
+        self.hits = self.misses = self.bypassed = 0
+
+    @staticmethod
+    def key(model_id: str, messages: List[Any], max_tokens: Optional[int], temperature: Optional[float]) -> str:
+        payload = json.dumps(
+            [model_id, [_message_dict(m) for m in messages], max_tokens, temperature],
+            ensure_ascii=False, sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, bypass: bool = False) -> Optional[str]:
+        """Cached completion for ``key``; with ``bypass`` always None (counted separately)."""
+        with self._lock:
+            if bypass:
+                self.bypassed += 1
+                return None
+            text = self._read(key) if key in self._entries else None
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return text
+
+    def put(self, key: str, text: str, model_id: str = ""):
+        with self._lock:
+            self._write(key, text, model_id=model_id)
+
+    def _counters(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+class CachedModel:
+    """Wraps a smolagents model so generate()/generate_stream() go through an LLMCache.
+
+    With ``bypass`` set, every call goes to the model and its completion
+    replaces the cached one. Other attributes are forwarded to the model.
+    """
+
+    def __init__(self, model, cache: LLMCache, bypass: bool = False):
+        self.model = model
+        self.cache = cache
+        self.bypass = bypass
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _key(self, messages, kwargs) -> str:
+        model_id = getattr(self.model, "model_id", None) or type(self.model).__name__
+        return self.cache.key(model_id, messages, kwargs.get("max_tokens"), kwargs.get("temperature"))
+
+    def generate(self, messages, **kwargs) -> ChatMessage:
+        key = self._key(messages, kwargs)
+        text = self.cache.get(key, bypass=self.bypass)
+        if text is not None:
+            return ChatMessage(role=MessageRole.ASSISTANT, content=text)
+        resp = self.model.generate(messages, **kwargs)
+        if resp.content is not None:
+            self.cache.put(key, resp.content, getattr(self.model, "model_id", ""))
+        return resp
+
+    def generate_stream(self, messages, **kwargs):
+        key = self._key(messages, kwargs)
+        text = self.cache.get(key, bypass=self.bypass)
+        if text is not None:
+            yield ChatMessageStreamDelta(content=text)
+            return
+        stream = getattr(self.model, "generate_stream", None)
+        if stream is None:
+            resp = self.model.generate(messages, **kwargs)
+            text = resp.content or ""
+            yield ChatMessageStreamDelta(content=text)
+        else:
+            parts = []
+            for delta in stream(messages, **kwargs):
+                if delta.content:
+                    parts.append(delta.content)
+                yield delta
+            text = "".join(parts)
+        # Only completed streams get here; an abandoned one is not cached.
+        self.cache.put(key, text, getattr(self.model, "model_id", ""))
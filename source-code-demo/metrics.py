@@ -0,0 +1,129 @@
+import contextvars, math, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+# Upper bounds (seconds) of the latency buckets; +Inf is implicit.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _fmt(v: float) -> str:
+    if isinstance(v, int):
+        return str(v)
+    return "+Inf" if v == float("inf") else repr(float(v))
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class Histogram:
+    """Cumulative histogram with one series per value of a single label,
+    rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help: str, label: str = "stage", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        # label value -> [per-bucket counts (last is +Inf), count, sum]
+        self._series: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(label_value)
+            if s is None:
+                s = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0, 0.0]
+            s[0][i] += 1
+            s[1] += 1
+            s[2] += value
+
+    def snapshot(self) -> Dict[str, dict]:
+        """{label value: {"count", "sum"}}"""
+        with self._lock:
+            return {k: {"count": s[1], "sum": round(s[2], 6)} for k, s in self._series.items()}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(s[0]), s[1], s[2]) for k, s in self._series.items()}
+        for value, (counts, count, total) in sorted(series.items()):
+            lab = f'{self.label}="{_escape(value)}"'
+            cum = 0
+            for le, n in zip(self.buckets + (float("inf"),), counts):
+                cum += n
+                lines.append(f'{self.name}_bucket{{{lab},le="{_fmt(le)}"}} {cum}')
+            lines.append(f"{self.name}_sum{{{lab}}} {_fmt(total)}")
+            lines.append(f"{self.name}_count{{{lab}}} {count}")
+        return lines
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of ``values``; None when there are none."""
+    if not values:
+        return None
+    s = sorted(values)
+    return s[max(0, math.ceil(p / 100 * len(s)) - 1)]
+
+def render_gauge(name: str, help: str, samples: Dict[str, float], label: str = "index") -> List[str]:
+    """A gauge family with one sample per value of ``label``."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    for value, v in sorted(samples.items()):
+        lines.append(f'{name}{{{label}="{_escape(value)}"}} {_fmt(v)}')
+    return lines
+
+# --------------------------- stage spans ---------------------------
+
+STAGE_SECONDS = Histogram("socratic_stage_seconds", "Wall time per pipeline stage.")
+
+class StageBreakdown:
+    """Seconds per stage for the spans finished inside one collect() block."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_dict(self, total: Optional[float] = None) -> Dict[str, float]:
+        with self._lock:
+            out = {k: round(v, 4) for k, v in self.stages.items()}
+        if total is not None:
+            out["total"] = round(total, 4)
+        return out
+
+_breakdown: "contextvars.ContextVar[Optional[StageBreakdown]]" = contextvars.ContextVar("stage_breakdown", default=None)
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    """Time a block into STAGE_SECONDS, and into the enclosing collect() if any.
+
+    Spans nest: a stage that calls other instrumented stages includes their time.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        STAGE_SECONDS.observe(dt, stage)
+        breakdown = _breakdown.get()
+        if breakdown is not None:
+            breakdown.add(stage, dt)
+
+@contextmanager
+def collect() -> Iterator[StageBreakdown]:
+    """Gather the spans finished in this context until the block exits.
+
+    Threads and tasks started with asyncio (to_thread, gather) inherit the
+    context, so their spans count too; plain executor.submit calls do not.
+    """
+    breakdown = StageBreakdown()
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+def render(extra: Optional[List[str]] = None) -> str:
+    """Prometheus text exposition: the stage histogram plus ``extra`` lines."""
+    return "\n".join(STAGE_SECONDS.render() + (extra or [])) + "\n"
@@ -0,0 +1,115 @@
+import random, sys, zlib
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+try:  # optional: vectorises signature()
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+_PRIME = (1 << 31) - 1  # a * x + b stays below 2**63 for 32-bit shingle hashes
+
+class MinHashDeduper:
+    """MinHash LSH over word shingles, for spotting near-duplicate chunks.
+
+    A chunk's signature is ``num_perm`` minima of universal hashes over its
+    ``shingle``-word shingles; the fraction of equal positions estimates the
+    Jaccard similarity of two chunks. Signatures are split into ``bands``
+    bands; chunks sharing any band are candidates, and a candidate counts as
+    a duplicate once its estimated similarity reaches ``threshold``.
+
+    Doc ids are the caller's; the caller decides which ids are still live.
+    """
+
+    def __init__(self, threshold: float = 0.8, num_perm: int = 32, bands: int = 8, shingle: int = 5, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        rng = random.Random(seed)
+        self._a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self._b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self._np_a = np.array(self._a, dtype=np.uint64)[:, None]
+            self._np_b = np.array(self._b, dtype=np.uint64)[:, None]
+        # band -> {band hash: doc id, or a list of doc ids on collision}
+        self._buckets: List[Dict[int, Any]] = [{} for _ in range(bands)]
+        self._sigs: Dict[int, array] = {}
+        # Chunks checked / dropped at ingest; maintained by the caller.
+        self.checked = self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._sigs)
+
+    def signature(self, tokens: Sequence[str]) -> Optional[array]:
+        """MinHash signature of a token list, or None if it is empty."""
+        if not tokens:
+            return None
+        k = min(self.shingle, len(tokens))
+        hashes = {zlib.crc32(" ".join(tokens[i:i + k]).encode("utf-8")) for i in range(len(tokens) - k + 1)}
+        if np is not None:
+            x = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))[None, :]
+            return array("I", ((self._np_a * x + self._np_b) % _PRIME).min(axis=1).astype(np.uint32).tobytes())
+        return array("I", (min((a * x + b) % _PRIME for x in hashes) for a, b in zip(self._a, self._b)))
+
+    def similarity(self, s1: array, s2: array) -> float:
+        return sum(x == y for x, y in zip(s1, s2)) / self.num_perm
+
+    def _band_keys(self, sig: array):
+        r = self.rows
+        for i in range(self.bands):
+            yield i, hash(tuple(sig[i * r:(i + 1) * r]))
+
+    def find(self, sig: Optional[array], live: Callable[[int], bool] = lambda d: True) -> Optional[int]:
+        """A live doc id whose chunk near-duplicates ``sig``, or None."""
+        if sig is None:
+            return None
+        seen = set()
+        for i, key in self._band_keys(sig):
+            hit = self._buckets[i].get(key)
+            if hit is None:
+                continue
+            for d in (hit if isinstance(hit, list) else (hit,)):
+                if d in seen:
+                    continue
+                seen.add(d)
+                if live(d) and self.similarity(sig, self._sigs[d]) >= self.threshold:
+                    return d
+        return None
+
+    def add(self, doc_id: int, sig: Optional[array]):
+        if sig is None:
+            return
+        self._sigs[doc_id] = sig
+        for i, key in self._band_keys(sig):
+            bucket = self._buckets[i]
+            hit = bucket.get(key)
+            if hit is None:
+                bucket[key] = doc_id
+            elif isinstance(hit, list):
+                hit.append(doc_id)
+            else:
+                bucket[key] = [hit, doc_id]
+
+    def clear(self):
+        self._buckets = [{} for _ in range(self.bands)]
+        self._sigs = {}
+
+    def approx_nbytes(self) -> int:
+        # Signatures all have num_perm entries, so this is O(bands), not O(chunks).
+        size = sys.getsizeof
+        sig = size(array("I")) + 4 * self.num_perm
+        return (sig * len(self._sigs) + size(self._sigs)
+                + sum(size(b) + 32 * len(b) for b in self._buckets))
+
+    def stats(self) -> dict:
+        return {
+            "signatures": len(self._sigs),
+            "checked": self.checked,
+            "dropped": self.dropped,
+            "dropped_ratio": round(self.dropped / self.checked, 3) if self.checked else 0.0,
+            "bytes": self.approx_nbytes(),
+        }
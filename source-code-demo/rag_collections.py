@@ -0,0 +1,179 @@
+import asyncio, logging, os, re, tempfile, threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional
+
+from rag_tool import WebRAGTool, INDEX_FILENAME
+from fetch_cache import FetchCache
+
+logger = logging.getLogger(__name__)
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+class CollectionManager:
+    """Named WebRAGTool collections sharing one memory budget.
+
+    Each collection has its own BM25Index under ``root/<name>``. When the
+    loaded collections' approx_nbytes() exceed ``budget_bytes``, the least
+    recently used ones that no request is using are saved to disk (unless
+    unchanged since their last save or load) and unloaded; the next request
+    for them maps them back in.
+    """
+
+    def __init__(self, root: Optional[str] = None, budget_bytes: int = 512 * 1024 * 1024,
+                 fetch_cache: Optional[FetchCache] = None, dedup: bool = False):
+        self.root = root or tempfile.mkdtemp(prefix="rag_collections_")
+        self.budget_bytes = budget_bytes
+        self.fetch_cache = fetch_cache
+        self.dedup = dedup
+        self.evictions = 0
+        self.save_errors = 0
+        self._loaded: "OrderedDict[str, WebRAGTool]" = OrderedDict()  # least recently used first
+        self._pins: Dict[str, int] = {}
+        self._unloading: Dict[str, WebRAGTool] = {}  # being saved; requests may revive them
+        self._loading: Dict[str, Future] = {}  # being loaded outside the lock; others wait on it
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def check_name(name: str) -> str:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"invalid collection name: {name!r}")
+        return name
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, self.check_name(name))
+
+    def _on_disk(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self._path(name), INDEX_FILENAME))
+
+    @contextmanager
+    def use(self, name: str, enforce: bool = True):
+        """Yield the collection's tool, pinned so it is not unloaded mid-request.
+
+        Leaving the block runs enforce_budget(), which may save collections;
+        async callers use ause() instead, which keeps both off the event loop.
+        """
+        tool = self._acquire(name)
+        try:
+            yield tool
+        finally:
+            self._release(name)
+            if enforce:
+                self.enforce_budget()
+
+    @asynccontextmanager
+    async def ause(self, name: str):
+        """use() for async callers: loading and enforce_budget() run in threads."""
+        tool = await asyncio.to_thread(self._acquire, name)
+        try:
+            yield tool
+        finally:
+            self._release(name)
+            await asyncio.to_thread(self.enforce_budget)
+
+    def _acquire(self, name: str) -> WebRAGTool:
+        """The collection's tool, pinned; loads it from disk (or creates it) if needed.
+
+        A cold load runs outside the manager lock, so it does not stall other
+        collections; concurrent requests for the same name wait on one load.
+        """
+        path = self._path(name)
+        while True:
+            with self._lock:
+                tool = self._loaded.get(name)
+                if tool is None and name in self._unloading:
+                    # Mid-eviction save: revive this object; enforce_budget sees it is no longer unloading.
+                    tool = self._loaded[name] = self._unloading.pop(name)
+                if tool is not None:
+                    self._loaded.move_to_end(name)
+                    self._pins[name] = self._pins.get(name, 0) + 1
+                    return tool
+                loading = self._loading.get(name)
+                if loading is None:
+                    loading = self._loading[name] = Future()
+                    break
+            loading.result()  # another request is loading it; then pin it under the lock
+        try:
+            if self._on_disk(name):
+                tool = WebRAGTool.load(path, fetch_cache=self.fetch_cache, dedup=self.dedup)
+            else:
+                tool = WebRAGTool(fetch_cache=self.fetch_cache, dedup=self.dedup)
+        except BaseException as e:
+            with self._lock:
+                del self._loading[name]
+            loading.set_exception(e)
+            raise
+        with self._lock:
+            del self._loading[name]
+            self._loaded[name] = tool
+            self._pins[name] = self._pins.get(name, 0) + 1
+        loading.set_result(tool)
+        return tool
+
+    def _release(self, name: str):
+        with self._lock:
+            self._pins[name] -= 1
+            if not self._pins[name]:
+                del self._pins[name]
+
+    def save(self, name: str):
+        with self.use(name) as tool:
+            tool.save(self._path(name))
+
+    def loaded_nbytes(self) -> int:
+        with self._lock:
+            tools = list(self._loaded.values())
+        return sum(t.approx_nbytes() for t in tools)
+
+    def enforce_budget(self):
+        """Unload LRU collections (saving them first) until under budget."""
+        with self._lock:
+            sizes = {n: t.approx_nbytes() for n, t in self._loaded.items()}  # O(1) each
+            total = sum(sizes.values())
+            victims = []
+            for name in list(self._loaded):
+                if total <= self.budget_bytes:
+                    break
+                if name in self._pins:
+                    continue
+                tool = self._loaded.pop(name)
+                self._unloading[name] = tool
+                victims.append((name, tool))
+                total -= sizes[name]
+        for name, tool in victims:
+            # Save outside the manager lock; a request arriving meanwhile reuses this object.
+            # Collections are only ever saved to their own path, so an unchanged
+            # generation means the file on disk is already current.
+            saved = False
+            try:
+                if tool.saved_generation != tool.idx.generation and (len(tool.idx) or tool.seen_urls):
+                    tool.save(self._path(name))
+                saved = True
+            except Exception:
+                # Keep it loaded (and counted) rather than lose it; the next enforce_budget retries.
+                logger.exception("could not save collection %r; keeping it loaded", name)
+                self.save_errors += 1
+            finally:
+                with self._lock:
+                    if self._unloading.get(name) is tool:  # else a request revived it
+                        del self._unloading[name]
+                        if saved:
+                            self.evictions += 1
+                        else:
+                            self._loaded[name] = tool
+                            self._loaded.move_to_end(name, last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            loaded = {n: t.approx_nbytes() for n, t in self._loaded.items()}
+        on_disk = sorted(n for n in os.listdir(self.root) if self._on_disk(n))
+        return {
+            "budget_bytes": self.budget_bytes,
+            "loaded_bytes": sum(loaded.values()),
+            "loaded": loaded,
+            "on_disk": on_disk,
+            "evictions": self.evictions,
+            "save_errors": self.save_errors,
+        }
@@ -1,8 +1,29 @@
 from smolagents import Tool
-from typing import List, Optional, Tuple, Dict, Any
-import requests, re, math
+from typing import List, Optional, Tuple, Dict, Any, Iterable, Iterator, Union
+import requests, re, math, heapq, json, mmap, os, sys, asyncio, threading
+from urllib.parse import urlsplit
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
 from bs4 import BeautifulSoup
-from collections import Counter, defaultdict
+from lxml import etree
+from collections import Counter, OrderedDict, defaultdict
+from collections.abc import Sequence
+from fetch_cache import FetchCache
+from near_dup import MinHashDeduper
+from metrics import span
+
+try:  # optional: only needed for SparseBM25Index
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # pragma: no cover
+    np = sparse = None
+
+# Async ingest limits: total in-flight fetches, and in-flight fetches per host.
+INGEST_CONCURRENCY = 8
+INGEST_PER_HOST = 2
 
 DEFAULT_HEADERS = {
     "User-Agent": "Socratic_agent/1.0 (contact: youremail@example.com)",
@@ -17,11 +38,12 @@ def _wikipedia_plain_url(url: str) -> str | None:
     title = m.group(1)
     return f"https://en.wikipedia.org/api/rest_v1/page/plain/{title}"
 
-def _fetch_text(url: str) -> str:
+def _download(url: str) -> Tuple[requests.Response, str]:
+    """Fetch ``url``; returns the response and the URL that actually served the text."""
     # 1) Try regular HTML with headers
     resp = requests.get(url, timeout=20, headers=DEFAULT_HEADERS, allow_redirects=True)
     if resp.status_code == 200 and resp.text.strip():
-        return resp.text
+        return resp, url
 
     # 2) If blocked and it’s a wikipedia /wiki/ URL, retry via REST plain-text
     if resp.status_code in (403, 429) and "wikipedia.org/wiki/" in url:
@@ -29,10 +51,41 @@ def _fetch_text(url: str) -> str:
         if api_url:
             alt = requests.get(api_url, timeout=20, headers=DEFAULT_HEADERS)
             alt.raise_for_status()
-            return alt.text
+            return alt, api_url
 
     # 3) As a general fallback, raise
     resp.raise_for_status()
+    return resp, url
+
+@span("fetch")
+def _fetch_text(url: str, cache: Optional[FetchCache] = None, revalidate: bool = False) -> str:
+    """Fetch a page, going through ``cache`` if given (``revalidate`` ignores the TTL)."""
+    if cache is None:
+        return _download(url)[0].text
+
+    entry = cache.lookup(url)
+    if entry is not None:
+        if cache.is_fresh(entry) and not revalidate:
+            body = cache.read(url)
+            if body is not None:
+                return body
+        else:
+            # Revalidate against whichever URL produced the body (skips a repeat 403 on Wikipedia).
+            headers = {**DEFAULT_HEADERS, **cache.conditional_headers(entry)}
+            try:
+                resp = requests.get(entry["source"], timeout=20, headers=headers, allow_redirects=True)
+            except requests.RequestException:
+                resp = None
+            if resp is not None and resp.status_code == 304:
+                body = cache.read(url, revalidated=True)
+                if body is not None:
+                    return body
+            elif resp is not None and resp.status_code == 200 and resp.text.strip():
+                cache.store(url, resp.text, source=entry["source"], headers=resp.headers)
+                return resp.text
+
+    resp, source = _download(url)
+    cache.store(url, resp.text, source=source, headers=resp.headers)
     return resp.text
     
 def _clean(text: str) -> str:
@@ -45,17 +98,121 @@ def _extract_text_from_html(html: str) -> str:
     text = soup.get_text(" ")
     return _clean(text)
 
+# What may follow "<" in a tag, comment or doctype; also matches the end of
+# the text, where the next feed decides.
+_TAG_START = re.compile(r"[A-Za-z/!?]|$")
+# Longest unfinished tag held back between feeds before it is fed as text.
+STREAM_HOLD_CHARS = 4096
+
+# An entity reference split by the byte budget, e.g. "&am".
+_PARTIAL_ENTITY = re.compile(r"&#?\w*$")
+
+# Tags whose contents never reach the index in streaming mode.
+STREAM_SKIP_TAGS = frozenset({"script", "style", "noscript", "nav"})
+
+class _TextTarget:
+    """lxml parser target that collects visible text, dropping STREAM_SKIP_TAGS subtrees."""
+
+    def __init__(self):
+        self.pending: List[str] = []
+        self.skip = 0
+
+    def start(self, tag, attrib):
+        if tag in STREAM_SKIP_TAGS:
+            self.skip += 1
+        self.pending.append(" ")  # like get_text(" "): tags separate words
+
+    def end(self, tag):
+        if tag in STREAM_SKIP_TAGS and self.skip:
+            self.skip -= 1
+        self.pending.append(" ")
+
+    def data(self, data):
+        if not self.skip:
+            self.pending.append(data)
+
+    def comment(self, text):
+        pass
+
+    def close(self):
+        return None
+
+def _iter_html_words(
+    html: str,
+    max_bytes: Optional[int] = None,
+    max_words: Optional[int] = None,
+    feed_chars: int = 64 * 1024,
+) -> Iterator[str]:
+    """Yield the visible words of ``html`` while parsing it incrementally.
+
+    Stops once ``max_bytes`` of (UTF-8) input has been fed or ``max_words``
+    words have been produced. No tree and no full-page text string is built.
+    The byte cut backs off to a character boundary and drops a tag or entity
+    it would split, so a budget never yields broken characters or markup.
+    """
+    if not html or html.isspace():
+        return
+    target = _TextTarget()
+    parser = etree.HTMLParser(target=target, encoding="utf-8")
+    fed = emitted = 0
+    carry = held = ""
+    pos = 0
+    while True:
+        piece = html[pos:pos + feed_chars]
+        pos += len(piece)
+        text = held + piece
+        held = ""
+        data = text.encode("utf-8")
+        cut = max_bytes is not None and fed + len(data) > max_bytes
+        if cut:
+            text = data[:max(0, max_bytes - fed)].decode("utf-8", "ignore")
+            text = _PARTIAL_ENTITY.sub("", text)
+            piece = ""  # budget reached: this is the last feed
+        if piece or cut:
+            # A tag still open at the end of this feed waits for the next one,
+            # so a budget cut can drop it whole. A "<" that cannot start a tag
+            # ("a < b") is text, and held text past STREAM_HOLD_CHARS is fed as is.
+            lt = text.rfind("<")
+            if (lt > text.rfind(">") and len(text) - lt <= STREAM_HOLD_CHARS
+                    and _TAG_START.match(text, lt + 1)):
+                text, held = text[:lt], text[lt:]
+        data = text.encode("utf-8")
+        fed += len(data)
+        if data:
+            parser.feed(data)
+        if not piece:
+            try:
+                parser.close()
+            except etree.XMLSyntaxError:  # nothing but whitespace was fed
+                pass
+        text = carry + "".join(target.pending)
+        target.pending.clear()
+        words = text.split()
+        # A word may continue in the next feed unless the text ended on whitespace.
+        carry = words.pop() if piece and words and not text[-1].isspace() else ""
+        for w in words:
+            if max_words is not None and emitted >= max_words:
+                return
+            emitted += 1
+            yield w
+        if not piece:
+            return
+
+def _chunk_words(words: Iterable[str], chunk_words: int = 180, overlap: int = 30) -> Iterator[str]:
+    """Streaming _chunk: same windows, but consumes words lazily."""
+    step = max(1, chunk_words - overlap)
+    buf: List[str] = []
+    for w in words:
+        buf.append(w)
+        if len(buf) >= chunk_words:
+            yield " ".join(buf[:chunk_words])
+            del buf[:step]
+    while buf:
+        yield " ".join(buf[:chunk_words])
+        del buf[:step]
+
 def _chunk(text: str, chunk_words: int = 180, overlap: int = 30) -> List[str]:
-    words = text.split()
-    chunks = []
-    i = 0
-    while i < len(words):
-        part = words[i:i + chunk_words]
-        if not part:
-            break
-        chunks.append(" ".join(part))
-        i += max(1, chunk_words - overlap)
-    return chunks
+    return list(_chunk_words(text.split(), chunk_words, overlap))
 
 # --------------------------- BM25 (pure Python) ---------------------------
 
@@ -63,56 +220,882 @@ def _tokenize(text: str) -> List[str]:
     text = text.lower()
     return re.findall(r"[a-z0-9]+", text)
 
+# --------------------------- postings codec ---------------------------
+#
+# A term's postings are one byte string of unsigned LEB128 varints:
+# (doc id gap, tf) pairs in ascending doc id order, the first gap counted
+# from doc id 0. Typical chunks need 2-3 bytes per posting.
+
+_EMPTY_BUF_BYTES = sys.getsizeof(bytearray())
+
+def _put_varint(buf: bytearray, n: int):
+    while n > 0x7F:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def _decode_postings(buf) -> Tuple[array, array]:
+    """Varint postings bytes -> (doc ids, tfs) as two array('I')."""
+    if np is not None and len(buf) > 4096:
+        b = np.frombuffer(buf, dtype=np.uint8)
+        ends = np.flatnonzero(b < 0x80)
+        if len(ends) == len(b):
+            vals = b.astype(np.uint64)
+        else:
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            shift = 7 * (np.arange(len(b)) - np.repeat(starts, ends - starts + 1))
+            vals = np.add.reduceat((b & 0x7F).astype(np.uint64) << shift.astype(np.uint64), starts)
+        ids, tfs = array("I"), array("I")
+        ids.frombytes(np.cumsum(vals[0::2]).astype(np.uint32).tobytes())
+        tfs.frombytes(vals[1::2].astype(np.uint32).tobytes())
+        return ids, tfs
+    vals, n, shift = [], 0, 0
+    for byte in buf:
+        if byte & 0x80:
+            n |= (byte & 0x7F) << shift
+            shift += 7
+        else:
+            vals.append(n | (byte << shift))
+            n = shift = 0
+    return array("I", accumulate(vals[0::2])), array("I", vals[1::2])
+
+# --------------------------- On-disk index format ---------------------------
+#
+# One file: MAGIC, a little-endian u64 header length, a JSON header, then
+# 8-byte aligned sections of native-order arrays. The header records each
+# section as [offset, nbytes, typecode] relative to the first section.
+# Postings are stored exactly as they sit in memory (varint bytes per term).
+
+INDEX_MAGIC = b"BM25IDX2"
+INDEX_FILENAME = "rag_index.bin"
+
+class _MappedBuffers(Sequence):
+    """Byte slices of a mapped file, one per id, from an offsets + bytes section pair."""
+
+    def __init__(self, offsets, data):
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.data[self.offsets[i]:self.offsets[i + 1]]
+
+class _MappedStrings(Sequence):
+    """Strings (or JSON values) decoded on access from an offsets + bytes section pair."""
+
+    def __init__(self, offsets, data, as_json: bool = False):
+        self.offsets = offsets
+        self.data = data
+        self.as_json = as_json
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        raw = str(self.data[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+        return json.loads(raw) if self.as_json else raw
+
+def _encode_strings(items) -> Tuple[array, array]:
+    offsets, data = array("Q", [0]), array("B")
+    for item in items:
+        data.frombytes(item.encode("utf-8"))
+        offsets.append(len(data))
+    return offsets, data
+
+def _write_index_file(path: str, header: dict, sections: Dict[str, array]):
+    layout, pos = {}, 0
+    for name, arr in sections.items():
+        nbytes = len(arr) * arr.itemsize
+        layout[name] = [pos, nbytes, arr.typecode]
+        pos += nbytes + (-nbytes % 8)
+    header = dict(header, byteorder=sys.byteorder, sections=layout)
+    head = json.dumps(header).encode("utf-8")
+    head += b" " * (-(len(INDEX_MAGIC) + 8 + len(head)) % 8)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(INDEX_MAGIC)
+        f.write(len(head).to_bytes(8, "little"))
+        f.write(head)
+        for arr in sections.values():
+            arr.tofile(f)
+            f.write(b"\0" * (-(len(arr) * arr.itemsize) % 8))
+    # Readers that mapped the old file keep their inode; new readers see a whole file.
+    os.replace(tmp, path)
+
+def _map_index_file(path: str) -> Tuple[dict, Dict[str, memoryview], mmap.mmap]:
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mm[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+        if mm[:6] == INDEX_MAGIC[:6]:
+            raise ValueError(f"{path}: older BM25 index format; re-ingest to rebuild it")
+        raise ValueError(f"{path}: not a BM25 index file")
+    hlen = int.from_bytes(mm[len(INDEX_MAGIC):len(INDEX_MAGIC) + 8], "little")
+    start = len(INDEX_MAGIC) + 8
+    header = json.loads(mm[start:start + hlen])
+    if header.get("byteorder") != sys.byteorder:
+        raise ValueError(f"{path}: written on a {header.get('byteorder')}-endian machine")
+    base = memoryview(mm)[start + hlen:]
+    views = {}
+    for name, (off, nbytes, typecode) in header["sections"].items():
+        views[name] = base[off:off + nbytes].cast(typecode)
+    return header, views, mm
+
 class BM25Index:
     """A tiny, dependency-free BM25 index for small corpora."""
+    # Compact once tombstoned chunks exceed this fraction of the doc-id space.
+    compact_ratio = 0.25
+    # MaxScore dynamic pruning for multi-term queries; False forces exhaustive scoring.
+    pruning = True
+    # Decoded postings kept for hot terms, counted in postings (8 bytes each).
+    decoded_cache_postings = 1 << 20
+
     def __init__(self, k1: float = 1.5, b: float = 0.75):
         self.k1 = k1
         self.b = b
-        self.docs: List[List[str]] = []
         self.texts: List[str] = []
         self.metas: List[dict] = []
-        self.df: Dict[str, int] = defaultdict(int)
+        # Vocabulary: term <-> term id. Everything below is indexed by term id.
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.df = array("I")
+        # Inverted index: varint-compressed (doc id gap, tf) pairs per term, see
+        # _decode_postings. Per-chunk term frequencies live only here.
+        self.postings: List[bytearray] = []
+        self._last_doc = array("I")  # last doc id appended to each term's postings
+        self.doc_lens = array("I")
+        # Removed chunks stay in the arrays/postings until compact(); stats exclude them.
+        self.dead: set = set()
+        self.total_len = 0
         self.avgdl = 0.0
+        # Bumped by compact(), which renumbers doc ids.
+        self.epoch = 0
+        # Bumped on every change that can alter search results.
+        self.generation = 0
+        self._idf_cache: Dict[str, float] = {}
+        # term id -> (max tf, min chunk length) over its postings, filled lazily for pruning.
+        self._term_bounds: Dict[int, Tuple[int, int]] = {}
+        # term id -> (doc ids, tfs), least recently used first; readers share it.
+        self._decoded: "OrderedDict[int, Tuple[array, array]]" = OrderedDict()
+        self._decoded_size = 0
+        self._decoded_lock = threading.Lock()
+        self._mmap: Optional[mmap.mmap] = None
+        # Heap bytes outside the decoded cache, kept current by add/compact/load
+        # so approx_nbytes() is O(1); memory_report() walks everything.
+        self._nbytes = self._heap_nbytes()
 
-    def add_documents(self, chunks: List[str], metadatas: Optional[List[dict]] = None):
+    def __len__(self) -> int:
+        return len(self.doc_lens) - len(self.dead)
+
+    def approx_nbytes(self) -> int:
+        """O(1) running estimate of memory_report()["total_bytes"]."""
+        return self._nbytes + 8 * self._decoded_size
+
+    def _heap_nbytes(self) -> int:
+        report = self.memory_report()
+        return report["total_bytes"] - report["decoded_cache_bytes"]
+
+    def memory_report(self) -> dict:
+        """Heap bytes by component (CPython sizes). A mapped index keeps its
+        postings, texts and metadata in the page cache; only the vocabulary
+        and decoded hot postings count against the heap."""
+        size = sys.getsizeof
+        mapped = self._mmap is not None
+        encoded = sum(len(p) for p in self.postings)
+        n_postings = sum(self.df)
+        with self._decoded_lock:
+            decoded = sum(size(ids) + size(tfs) for ids, tfs in self._decoded.values())
+        report = {
+            "chunks": len(self),
+            "terms": len(self.vocab),
+            "postings": n_postings,
+            "postings_encoded_bytes": encoded,
+            "bytes_per_posting": round(encoded / n_postings, 2) if n_postings else 0.0,
+            "mapped_bytes": len(self._mmap) if mapped else 0,
+            "vocab_bytes": size(self.vocab) + sum(size(t) for t in self.vocab),
+            "decoded_cache_bytes": decoded,
+        }
+        if mapped:
+            report.update(postings_bytes=0, text_bytes=0, meta_bytes=0, doc_len_bytes=0)
+        else:
+            report.update(
+                vocab_bytes=report["vocab_bytes"] + size(self.terms),
+                postings_bytes=(size(self.postings) + sum(size(p) for p in self.postings)
+                                + size(self.df) + size(self._last_doc)),
+                text_bytes=size(self.texts) + sum(size(t) for t in self.texts),
+                meta_bytes=size(self.metas) + sum(size(m) for m in self.metas),
+                doc_len_bytes=size(self.doc_lens),
+            )
+        report["total_bytes"] = sum(v for k, v in report.items()
+                                    if k.endswith("_bytes") and k not in ("mapped_bytes", "postings_encoded_bytes"))
+        return report
+
+    def add_documents(self, chunks: List[str], metadatas: Optional[List[dict]] = None) -> range:
         if not chunks:
-            return
+            return range(len(self.doc_lens), len(self.doc_lens))
+        return self.add_term_freqs(chunks, metadatas, [Counter(_tokenize(text)) for text in chunks])
+
+    def add_term_freqs(
+        self,
+        chunks: List[str],
+        metadatas: Optional[List[dict]],
+        term_freqs: List[Dict[str, int]],
+    ) -> range:
+        """add_documents for chunks that were already tokenized (e.g. in a worker process).
+
+        ``term_freqs`` must come from _tokenize(chunk) so remove_documents can undo them.
+        Returns the doc ids assigned to the new chunks.
+        """
+        start = len(self.doc_lens)
+        if not chunks:
+            return range(start, start)
+        self._thaw()
         metadatas = metadatas or [{} for _ in chunks]
-        for text, meta in zip(chunks, metadatas):
-            toks = _tokenize(text)
-            self.docs.append(toks)
+        vocab, df, postings, last = self.vocab, self.df, self.postings, self._last_doc
+        bounds, decoded = self._term_bounds, self._decoded
+        size = sys.getsizeof
+        nbytes = 0
+        for text, meta, freqs in zip(chunks, metadatas, term_freqs):
+            doc_id = len(self.doc_lens)
+            dl = sum(freqs.values())
+            self.doc_lens.append(dl)
+            self.total_len += dl
             self.texts.append(text)
             self.metas.append(meta)
-            for term in set(toks):
-                self.df[term] += 1
-        self.avgdl = sum(len(d) for d in self.docs) / max(1, len(self.docs))
+            nbytes += size(text) + size(meta) + 20  # two list slots and a doc length
+            for term, tf in freqs.items():
+                tid = vocab.get(term)
+                if tid is None:
+                    tid = vocab[term] = len(self.terms)
+                    self.terms.append(term)
+                    df.append(0)
+                    postings.append(bytearray())
+                    last.append(0)
+                    nbytes += size(term) + _EMPTY_BUF_BYTES + 48  # dict entry, list slots, df, last
+                buf = postings[tid]
+                n = len(buf)
+                _put_varint(buf, doc_id - last[tid])
+                _put_varint(buf, tf)
+                nbytes += len(buf) - n
+                last[tid] = doc_id
+                df[tid] += 1
+                if tid in bounds:
+                    mtf, mdl = bounds[tid]
+                    bounds[tid] = (max(mtf, tf), min(mdl, dl))
+                if decoded and tid in decoded:
+                    self._forget(tid)
+        self._nbytes += nbytes
+        self._refresh_stats()
+        return range(start, len(self.doc_lens))
+
+    def remove_documents(self, doc_ids: Iterable[int]) -> int:
+        """Tombstone chunks and take them out of df/avgdl; cost is O(removed chunk size)."""
+        self._thaw()
+        removed = 0
+        for d in doc_ids:
+            if d in self.dead or not 0 <= d < len(self.doc_lens):
+                continue
+            self.dead.add(d)
+            self.total_len -= self.doc_lens[d]
+            for term in set(_tokenize(self.texts[d])):
+                self.df[self.vocab[term]] -= 1
+            removed += 1
+        if removed:
+            self._refresh_stats()
+            if len(self.dead) > self.compact_ratio * len(self.doc_lens):
+                self.compact()
+        return removed
+
+    def compact(self) -> Dict[int, int]:
+        """Drop tombstoned chunks and renumber doc ids; returns {old_id: new_id}."""
+        if not self.dead:
+            return {}
+        self._thaw()
+        remap, (texts, metas, lens, vocab, terms, df, postings, last) = self._compacted()
+        self.texts, self.metas, self.doc_lens = texts, metas, lens
+        self.vocab, self.terms, self.df, self.postings, self._last_doc = vocab, terms, df, postings, last
+        self.dead = set()
+        self._term_bounds.clear()
+        with self._decoded_lock:
+            self._decoded.clear()
+            self._decoded_size = 0
+        self.epoch += 1
+        self._nbytes = self._heap_nbytes()
+        self._refresh_stats()
+        return remap
+
+    def _compacted(self) -> Tuple[Dict[int, int], tuple]:
+        """(remap, (texts, metas, doc_lens, vocab, terms, df, postings, last_doc)) without
+        the tombstoned chunks; only reads the index, so readers may run alongside."""
+        remap: Dict[int, int] = {}
+        texts, metas, lens = [], [], array("I")
+        for old in range(len(self.doc_lens)):
+            if old in self.dead:
+                continue
+            remap[old] = len(lens)
+            texts.append(self.texts[old])
+            metas.append(self.metas[old])
+            lens.append(self.doc_lens[old])
+        vocab, terms, df, postings, last = {}, [], array("I"), [], array("I")
+        for tid, term in enumerate(self.terms):
+            buf, prev, n = bytearray(), 0, 0
+            for d, f in zip(*_decode_postings(self.postings[tid])):
+                new = remap.get(d)
+                if new is None:
+                    continue
+                _put_varint(buf, new - prev)
+                _put_varint(buf, f)
+                prev, n = new, n + 1
+            if n:
+                vocab[term] = len(terms)
+                terms.append(term)
+                df.append(n)
+                postings.append(buf)
+                last.append(prev)
+        return remap, (texts, metas, lens, vocab, terms, df, postings, last)
+
+    # --------------------------- persistence ---------------------------
+
+    def snapshot(self) -> "BM25Index":
+        """Frozen copy of what save() writes, for saving outside a lock.
+
+        Postings and the per-doc/per-term arrays are copied (a memcpy each);
+        texts, metas and terms are only ever appended to or replaced, so the
+        copy takes their current prefix. A mapped index is not mutated in
+        place at all (the first mutation thaws it onto the heap), so its
+        snapshot just shares the mapped views.
+        """
+        snap = BM25Index(k1=self.k1, b=self.b)
+        snap.total_len = self.total_len
+        snap.dead = set(self.dead)
+        if self._mmap is not None:
+            snap.texts, snap.metas, snap.terms = self.texts, self.metas, self.terms
+            snap.doc_lens, snap.df, snap._last_doc, snap.postings = self.doc_lens, self.df, self._last_doc, self.postings
+            return snap
+        n = len(self.doc_lens)
+        snap.texts, snap.metas, snap.terms = self.texts[:n], self.metas[:n], self.terms[:len(self.df)]
+        snap.doc_lens, snap.df, snap._last_doc = array("I", self.doc_lens), array("I", self.df), array("I", self._last_doc)
+        snap.postings = [bytes(p) for p in self.postings]
+        return snap
+
+    def save(self, path: str, extra: Optional[dict] = None) -> str:
+        """Write the index to ``path`` (a directory) as a single mmap-able file.
+
+        Tombstoned chunks are left out of the file but stay in memory: save()
+        never mutates the index, so it is safe under a read lock.
+        """
+        if self.dead:
+            _, (texts, metas, lens, _, terms, df, postings, last) = self._compacted()
+        else:
+            texts, metas, lens, terms, df, postings, last = (
+                self.texts, self.metas, self.doc_lens, self.terms, self.df, self.postings, self._last_doc)
+        os.makedirs(path, exist_ok=True)
+        post_offsets, post_bytes = array("Q", [0]), array("B")
+        for buf in postings:
+            post_bytes.frombytes(buf)
+            post_offsets.append(len(post_bytes))
+        term_offsets, term_bytes = _encode_strings(terms)
+        text_offsets, text_bytes = _encode_strings(texts)
+        meta_offsets, meta_bytes = _encode_strings(json.dumps(m, ensure_ascii=False) for m in metas)
+        header = {"k1": self.k1, "b": self.b, "total_len": self.total_len, "extra": extra or {}}
+        sections = {
+            "doc_lens": array("I", lens),
+            "df": array("I", df),
+            "last_doc": array("I", last),
+            "term_offsets": term_offsets,
+            "term_bytes": term_bytes,
+            "post_offsets": post_offsets,
+            "post_bytes": post_bytes,
+            "text_offsets": text_offsets,
+            "text_bytes": text_bytes,
+            "meta_offsets": meta_offsets,
+            "meta_bytes": meta_bytes,
+        }
+        out = os.path.join(path, INDEX_FILENAME)
+        _write_index_file(out, header, sections)
+        return out
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        """Open an index written by save(). Arrays stay in the page cache, not the heap."""
+        idx, _ = cls._load_with_extra(path)
+        return idx
+
+    @classmethod
+    def _load_with_extra(cls, path: str) -> Tuple["BM25Index", dict]:
+        header, v, mm = _map_index_file(os.path.join(path, INDEX_FILENAME))
+        idx = cls(k1=header["k1"], b=header["b"])
+        idx.doc_lens = v["doc_lens"]
+        idx.total_len = header.get("total_len", sum(idx.doc_lens))
+        idx.terms = _MappedStrings(v["term_offsets"], v["term_bytes"])
+        idx.vocab = {t: j for j, t in enumerate(idx.terms)}
+        idx.df = v["df"]
+        idx._last_doc = v["last_doc"]
+        idx.postings = _MappedBuffers(v["post_offsets"], v["post_bytes"])
+        idx.texts = _MappedStrings(v["text_offsets"], v["text_bytes"])
+        idx.metas = _MappedStrings(v["meta_offsets"], v["meta_bytes"], as_json=True)
+        idx._mmap = mm
+        idx._nbytes = idx._heap_nbytes()
+        idx._refresh_stats()
+        return idx, header.get("extra", {})
+
+    def _thaw(self):
+        """Copy a mapped index onto the heap before the first mutation."""
+        if self._mmap is None:
+            return
+        self.texts = list(self.texts)
+        self.metas = list(self.metas)
+        self.terms = list(self.vocab)
+        self.doc_lens = array("I", self.doc_lens)
+        self.df = array("I", self.df)
+        self._last_doc = array("I", self._last_doc)
+        self.postings = [bytearray(p) for p in self.postings]
+        # Views into the map may still be alive elsewhere; let GC close it.
+        self._mmap = None
+        self._nbytes = self._heap_nbytes()
+
+    def _refresh_stats(self):
+        """Update avgdl from the running totals and drop IDFs made stale by a new N."""
+        self.avgdl = self.total_len / max(1, len(self))
+        self._idf_cache.clear()
+        self.generation += 1
+
+    def _plist(self, term: str) -> Optional[Tuple[int, array, array]]:
+        """(term id, doc ids, tfs) for a term, or None if it is not in the vocabulary."""
+        tid = self.vocab.get(term)
+        if tid is None:
+            return None
+        with self._decoded_lock:
+            hit = self._decoded.get(tid)
+            if hit is not None:
+                self._decoded.move_to_end(tid)
+                return (tid, *hit)
+        ids, tfs = _decode_postings(self.postings[tid])
+        with self._decoded_lock:
+            if tid not in self._decoded:
+                self._decoded[tid] = (ids, tfs)
+                self._decoded_size += len(ids)
+                while self._decoded_size > self.decoded_cache_postings and len(self._decoded) > 1:
+                    _, (old, _) = self._decoded.popitem(last=False)
+                    self._decoded_size -= len(old)
+        return tid, ids, tfs
+
+    def _forget(self, tid: int):
+        with self._decoded_lock:
+            hit = self._decoded.pop(tid, None)
+            if hit is not None:
+                self._decoded_size -= len(hit[0])
+
+    def _norm_coeffs(self) -> Tuple[float, float]:
+        """(base, slope) such that k1 * (1 - b + b * dl / avgdl) == base + slope * dl."""
+        k1, b = self.k1, self.b
+        return k1 * (1 - b), k1 * b / max(1e-9, self.avgdl)
 
     def _idf(self, term: str) -> float:
-        n = len(self.docs)
-        df = self.df.get(term, 0)
-        return math.log((n - df + 0.5) / (df + 0.5) + 1.0)
+        idf = self._idf_cache.get(term)
+        if idf is None:
+            n = len(self)
+            tid = self.vocab.get(term)
+            df = self.df[tid] if tid is not None else 0
+            idf = math.log((n - df + 0.5) / (df + 0.5) + 1.0)
+            self._idf_cache[term] = idf
+        return idf
+
+    def _tf(self, term: str, idx: int) -> int:
+        pl = self._plist(term)
+        if pl is None or idx in self.dead:
+            return 0
+        _, ids, tfs = pl
+        pos = bisect_left(ids, idx)
+        if pos < len(ids) and ids[pos] == idx:
+            return tfs[pos]
+        return 0
 
     def score(self, query: str, idx: int) -> float:
-        q_toks = _tokenize(query)
-        doc = self.docs[idx]
-        freq = Counter(doc)
         score = 0.0
-        dl = len(doc)
-        for t in q_toks:
-            if t not in freq:
+        k1p1 = self.k1 + 1
+        base, slope = self._norm_coeffs()
+        for t, qtf in Counter(_tokenize(query)).items():
+            f = self._tf(t, idx)
+            if not f:
                 continue
-            idf = self._idf(t)
-            f = freq[t]
-            denom = f + self.k1 * (1 - self.b + self.b * dl / max(1e-9, self.avgdl))
-            score += idf * (f * (self.k1 + 1)) / max(1e-9, denom)
+            score += qtf * self._idf(t) * (f * k1p1 / (f + base + slope * self.doc_lens[idx]))
         return score
 
     def search(self, query: str, top_k: int = 4) -> List[Tuple[float, str, dict]]:
-        if not self.docs:
+        """Score only the chunks that contain a query term (term-at-a-time over postings)."""
+        if not len(self) or top_k <= 0:
             return []
-        scores = [(self.score(query, i), self.texts[i], self.metas[i]) for i in range(len(self.docs))]
-        scores.sort(key=lambda x: x[0], reverse=True)
-        return scores[:top_k]
+        weights = self._query_weights(query)
+        base, slope = self._norm_coeffs()
+        if self.pruning and len(weights) > 1:
+            return self._hits(self._maxscore_ids(weights, base, slope, top_k))
+        return self._top_k(self._accumulate(weights, base, slope), top_k)
+
+    def _query_weights(self, query: str) -> List[Tuple[str, float]]:
+        """[(term, qtf * idf)] in query order; the only corpus-wide stats a query needs."""
+        return [(t, qtf * self._idf(t)) for t, qtf in Counter(_tokenize(query)).items()]
+
+    def _accumulate(self, weights: List[Tuple[str, float]], base: float, slope: float) -> Dict[int, float]:
+        acc: Dict[int, float] = {}
+        lens, dead = self.doc_lens, self.dead
+        k1p1 = self.k1 + 1
+        for t, w in weights:
+            pl = self._plist(t)
+            if pl is None:
+                continue
+            for doc_id, f in zip(pl[1], pl[2]):
+                if dead and doc_id in dead:
+                    continue
+                acc[doc_id] = acc.get(doc_id, 0.0) + w * (f * k1p1 / (f + base + slope * lens[doc_id]))
+        return acc
+
+    def search_batch(self, queries: List[str], top_k: int = 4) -> List[List[Tuple[float, str, dict]]]:
+        """search() for many queries, sharing tokenization, IDFs and postings decoding.
+
+        Each distinct query is tokenized and weighted once, and each distinct
+        term's postings are decoded once for the whole batch. With pruning on,
+        multi-term queries then run their own MaxScore traversal over those
+        shared postings: skipping most postings per query beats one shared
+        exhaustive pass, so the batch saves the per-query setup rather than
+        the traversal. The remaining queries read each posting once for the
+        whole batch and add its BM25 tf part to every query that uses the
+        term. Scores match search() up to float summation order.
+        """
+        if not len(self) or top_k <= 0:
+            return [[] for _ in queries]
+        distinct = list(dict.fromkeys(queries))
+        weights = {q: self._query_weights(q) for q in distinct}
+        plists = {t: self._plist(t) for ws in weights.values() for t, _ in ws}
+        base, slope = self._norm_coeffs()
+        results: Dict[str, List[Tuple[float, str, dict]]] = {}
+        if self.pruning:
+            for q in distinct:
+                if len(weights[q]) > 1:
+                    results[q] = self._hits(self._maxscore_ids(weights[q], base, slope, top_k, plists))
+            distinct = [q for q in distinct if q not in results]
+        users: Dict[str, List[Tuple[int, float]]] = defaultdict(list)  # term -> [(query no, weight)]
+        for qi, q in enumerate(distinct):
+            for t, w in weights[q]:
+                users[t].append((qi, w))
+        accs: List[Dict[int, float]] = [{} for _ in distinct]
+        lens, dead = self.doc_lens, self.dead
+        k1p1 = self.k1 + 1
+        for t in users:
+            pl = plists[t]
+            if pl is None:
+                continue
+            ws = [(accs[qi], w) for qi, w in users[t]]
+            for doc_id, f in zip(pl[1], pl[2]):
+                if dead and doc_id in dead:
+                    continue
+                part = f * k1p1 / (f + base + slope * lens[doc_id])
+                for acc, w in ws:
+                    acc[doc_id] = acc.get(doc_id, 0.0) + w * part
+        results.update((q, self._top_k(acc, top_k)) for q, acc in zip(distinct, accs))
+        return [results[q] for q in queries]
+
+    def _term_bound(self, tid: int, ids: array, tfs: array) -> Tuple[int, int]:
+        b = self._term_bounds.get(tid)
+        if b is None:
+            b = self._term_bounds[tid] = (max(tfs), min(map(self.doc_lens.__getitem__, ids)))
+        return b
+
+    def _maxscore_ids(self, weights: List[Tuple[str, float]], base: float, slope: float, top_k: int,
+                      plists: Optional[Dict[str, Optional[tuple]]] = None) -> List[Tuple[float, int]]:
+        """Document-at-a-time MaxScore top-k; same output as _top_ids(_accumulate(...)).
+
+        Each term's score is bounded by its max tf and shortest chunk. Terms are
+        ordered by that bound; once the cheapest ones together cannot lift a
+        chunk over the current k-th score they stop driving candidates
+        ("non-essential") and are only probed, with bisect, for chunks that
+        might still make it. Survivors are re-summed in query-term order so
+        their scores are bit-identical to exhaustive scoring. ``plists`` maps
+        terms to already decoded _plist() results (search_batch shares them).
+        """
+        lens, dead = self.doc_lens, self.dead
+        k1p1 = self.k1 + 1
+        terms = []  # (upper bound, query position, weight, doc ids, tfs)
+        for qpos, (t, w) in enumerate(weights):
+            pl = plists[t] if plists is not None else self._plist(t)
+            if pl is None:
+                continue
+            mtf, mdl = self._term_bound(*pl)
+            terms.append((w * (mtf * k1p1 / (mtf + base + slope * mdl)), qpos, w, pl[1], pl[2]))
+        terms.sort(key=lambda x: x[0])
+        n = len(terms)
+        prefix = [0.0]
+        for term in terms:
+            prefix.append(prefix[-1] + term[0])
+        pos = [0] * n
+        heap: List[Tuple[float, int]] = []  # (score, -doc_id); heap[0] is the current k-th best
+        theta, first_ess = -1.0, 0
+        parts: Dict[int, float] = {}
+        while first_ess < n:
+            d = None
+            for i in range(first_ess, n):
+                ids = terms[i][3]
+                if pos[i] < len(ids) and (d is None or ids[pos[i]] < d):
+                    d = ids[pos[i]]
+            if d is None:
+                break
+            parts.clear()
+            score = 0.0
+            for i in range(first_ess, n):
+                _, qpos, w, ids, tfs = terms[i]
+                p = pos[i]
+                if p < len(ids) and ids[p] == d:
+                    f = tfs[p]
+                    c = w * (f * k1p1 / (f + base + slope * lens[d]))
+                    parts[qpos] = c
+                    score += c
+                    pos[i] = p + 1
+            if dead and d in dead:
+                continue
+            # Float slack so a chunk that exactly ties the threshold is still scored.
+            eps = 1e-9 * max(1.0, theta)
+            pruned = False
+            for i in range(first_ess - 1, -1, -1):
+                if score + prefix[i + 1] < theta - eps:
+                    pruned = True
+                    break
+                _, qpos, w, ids, tfs = terms[i]
+                p = bisect_left(ids, d, pos[i])
+                pos[i] = p
+                if p < len(ids) and ids[p] == d:
+                    f = tfs[p]
+                    c = w * (f * k1p1 / (f + base + slope * lens[d]))
+                    parts[qpos] = c
+                    score += c
+            if pruned:
+                continue
+            exact = 0.0
+            for qpos in sorted(parts):
+                exact += parts[qpos]
+            entry = (exact, -d)
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            else:
+                continue
+            if len(heap) == top_k:
+                theta = heap[0][0]
+                eps = 1e-9 * max(1.0, theta)
+                while first_ess < n and prefix[first_ess + 1] < theta - eps:
+                    first_ess += 1
+        # A heap that never filled saw every matching chunk, so padding stays correct.
+        return self._top_ids({-negd: sc for sc, negd in heap}, top_k)
+
+    def pruning_mismatches(self, queries: List[str], top_k: int = 4) -> List[str]:
+        """Queries whose pruned and exhaustive top-k differ (should always be empty)."""
+        bad = []
+        base, slope = self._norm_coeffs()
+        for q in queries:
+            weights = self._query_weights(q)
+            exhaustive = self._top_ids(self._accumulate(weights, base, slope), top_k)
+            if self._maxscore_ids(weights, base, slope, top_k) != exhaustive:
+                bad.append(q)
+        return bad
+
+    def _top_k(self, acc: Dict[int, float], top_k: int) -> List[Tuple[float, str, dict]]:
+        return self._hits(self._top_ids(acc, top_k))
+
+    def _hits(self, ids: List[Tuple[float, int]]) -> List[Tuple[float, str, dict]]:
+        return [(score, self.texts[i], self.metas[i]) for score, i in ids]
+
+    def _top_ids(self, acc: Dict[int, float], top_k: int) -> List[Tuple[float, int]]:
+        # Ties keep corpus order, like the old full sort did.
+        best = heapq.nlargest(top_k, acc.items(), key=lambda kv: (kv[1], -kv[0]))
+        hits = [(score, i) for i, score in best]
+        # Callers always got top_k rows back; pad with zero-score chunks in corpus order.
+        i = 0
+        while len(hits) < top_k and i < len(self.doc_lens):
+            if i not in acc and i not in self.dead:
+                hits.append((0.0, i))
+            i += 1
+        return hits
+
+# --------------------------- BM25 (NumPy/SciPy) ---------------------------
+
+class SparseBM25Index(BM25Index):
+    """BM25Index backed by a CSR doc-term matrix of precomputed BM25 weights.
+
+    Ingest still goes through the postings; the matrix is rebuilt lazily on the
+    first search after new chunks arrive. Queries are scored as one sparse
+    product (one column per query) and top-k is taken with argpartition.
+    Requires numpy and scipy.
+    """
+    # Upper bound on dense score cells materialised at once in search_batch.
+    max_batch_cells = 1 << 22
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        if sparse is None:
+            raise ImportError("SparseBM25Index requires numpy and scipy (pip install numpy scipy)")
+        super().__init__(k1=k1, b=b)
+        self._matrix = None
+        self._dead_ids = None
+
+    def _refresh_stats(self):
+        super()._refresh_stats()
+        self._matrix = None
+
+    def _build_matrix(self):
+        # Columns are the base index's term ids, so self.vocab maps query terms directly.
+        decoded = [_decode_postings(buf) for buf in self.postings]
+        counts = np.fromiter((len(ids) for ids, _ in decoded), dtype=np.int64, count=len(decoded))
+        rows = np.concatenate([np.frombuffer(ids, dtype=np.uint32) for ids, _ in decoded] or [np.empty(0, np.uint32)])
+        tfs = np.concatenate([np.frombuffer(t, dtype=np.uint32) for _, t in decoded] or [np.empty(0, np.uint32)])
+        rows, tfs = rows.astype(np.int64), tfs.astype(np.float64)
+        cols = np.repeat(np.arange(len(decoded), dtype=np.int64), counts)
+        idfs = np.array([self._idf(t) for t in self.terms], dtype=np.float64)
+        base, slope = self._norm_coeffs()
+        norms = base + slope * np.asarray(self.doc_lens, dtype=np.float64)
+        data = idfs[cols] * (tfs * (self.k1 + 1)) / (tfs + norms[rows])
+        shape = (len(self.doc_lens), len(self.vocab))
+        self._dead_ids = np.fromiter(self.dead, dtype=np.int64, count=len(self.dead))
+        if len(self._dead_ids):
+            data[np.isin(rows, self._dead_ids)] = 0.0
+        self._matrix = sparse.csr_matrix((data, (rows, cols)), shape=shape)
+        self._matrix.eliminate_zeros()
+
+    def _query_matrix(self, queries: List[str]):
+        rows, cols, vals = [], [], []
+        for qi, q in enumerate(queries):
+            for t, qtf in Counter(_tokenize(q)).items():
+                j = self.vocab.get(t)
+                if j is not None:
+                    rows.append(j); cols.append(qi); vals.append(qtf)
+        shape = (len(self.vocab), len(queries))
+        return sparse.csc_matrix((vals, (rows, cols)), shape=shape, dtype=np.float64)
+
+    def search(self, query: str, top_k: int = 4) -> List[Tuple[float, str, dict]]:
+        return self.search_batch([query], top_k=top_k)[0]
+
+    def search_batch(self, queries: List[str], top_k: int = 4) -> List[List[Tuple[float, str, dict]]]:
+        if not len(self) or top_k <= 0:
+            return [[] for _ in queries]
+        if self._matrix is None:
+            self._build_matrix()
+        n = len(self.doc_lens)
+        k = min(top_k, len(self))
+        step = max(1, self.max_batch_cells // n)
+        out = []
+        for start in range(0, len(queries), step):
+            block = queries[start:start + step]
+            scores = (self._matrix @ self._query_matrix(block)).toarray()
+            scores[self._dead_ids, :] = -np.inf  # tombstones never pad the top-k
+            for col in range(scores.shape[1]):
+                out.append(self._top_k_dense(scores[:, col], k))
+        return out
+
+    def _top_k_dense(self, scores, k: int) -> List[Tuple[float, str, dict]]:
+        kth = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        # Keep every chunk tied with the k-th score so ties resolve by corpus order.
+        cand = np.flatnonzero(scores >= kth)
+        order = cand[np.lexsort((cand, -scores[cand]))][:k]
+        return [(float(scores[i]), self.texts[i], self.metas[i]) for i in order]
+
+# --------------------------- ingest helpers ---------------------------
+
+def _prepare_page(
+    url: str,
+    html_or_text: str,
+    stream_extract: bool = False,
+    max_bytes: Optional[int] = None,
+    max_words: Optional[int] = None,
+) -> Tuple[List[str], List[dict]]:
+    if stream_extract:
+        with span("extract"):  # parsing and chunking are one pass here
+            words = _iter_html_words(html_or_text, max_bytes, max_words)
+            chunks = list(_chunk_words(words))
+    else:
+        # If we got HTML, extract; if we got plain text (Wikipedia REST), _extract will just clean whitespace fine.
+        with span("extract"):
+            text = _extract_text_from_html(html_or_text)
+        with span("chunk"):
+            chunks = _chunk(text)
+    metas = [{"url": url, "chunk": i} for i in range(len(chunks))]
+    return chunks, metas
+
+def _prepare_page_tf(args: tuple) -> Union[str, Tuple[List[str], List[dict], List[Dict[str, int]]]]:
+    """Process-pool worker: raw page -> chunks, metas and per-chunk term frequencies.
+
+    A page that fails comes back as an ``"error: ..."`` string, so one bad page
+    does not lose the rest of the batch.
+    """
+    try:
+        chunks, metas = _prepare_page(*args)
+    except Exception as e:
+        return f"error: {e}"
+    return chunks, metas, [dict(Counter(_tokenize(c))) for c in chunks]
+
+# --------------------------- locking ---------------------------
+
+class _RWLock:
+    """Readers-writer lock: searches share it, index mutations take it alone.
+
+    Writers are preferred (new readers queue behind a waiting writer) and the
+    write side is re-entrant for the owning thread, so refresh_url can call
+    remove_url/_index. Slow work (fetch, extraction) is done before writing.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._depth = 0
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:  # reading inside our own write section
+                self._depth += 1
+            else:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                if self._writer == me:
+                    self._depth -= 1
+                else:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                self._waiting_writers += 1
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+                self._waiting_writers -= 1
+                self._writer = me
+            self._depth += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._cond.notify_all()
 
 class WebRAGTool(Tool):
     name = "web_rag"
@@ -139,11 +1122,44 @@ class WebRAGTool(Tool):
         },
     }
     output_type = "string"
+    # Formatted forward() answers kept per (query terms, top_k, index generation).
+    answer_cache_size = 256
 
-    def __init__(self):
+    def __init__(
+        self,
+        index: Optional[BM25Index] = None,
+        fetch_cache: Optional[FetchCache] = None,
+        stream_extract: bool = False,
+        max_page_bytes: Optional[int] = None,
+        max_page_words: Optional[int] = None,
+        dedup: bool = False,
+    ):
         super().__init__()
-        self.idx = BM25Index()
+        if index is not None and not hasattr(index, "texts"):
+            # e.g. ShardedBM25Index: removal, refresh and save() need the chunks in this process.
+            raise TypeError(f"{type(index).__name__} cannot back a WebRAGTool")
+        self.idx = index if index is not None else BM25Index()
+        self.fetch_cache = fetch_cache
+        # stream_extract: parse incrementally with lxml (skips <nav> too) under the page budgets.
+        self.stream_extract = stream_extract
+        self.max_page_bytes = max_page_bytes
+        self.max_page_words = max_page_words
+        # dedup: drop chunks that near-duplicate an indexed one (MinHash LSH, see near_dup.py).
+        self.dedup = MinHashDeduper() if dedup else None
+        self._dedup_epoch = -1
         self.seen_urls = set()
+        # url -> live doc ids; rebuilt from metas when idx.epoch moves (compaction renumbers).
+        self._url_docs: Optional[Dict[str, List[int]]] = None
+        self._url_docs_epoch = -1
+        self._answers: "OrderedDict[tuple, str]" = OrderedDict()
+        self._answers_lock = threading.Lock()
+        # Searches share this; ingest/removal/save hold it exclusively, but only
+        # for the in-memory index update (server handlers run on a threadpool).
+        self._index_lock = _RWLock()
+        self._save_lock = threading.Lock()
+        # idx.generation as of the last save()/load(); None if never persisted.
+        self.saved_generation: Optional[int] = None
+        self.cache_hits = self.cache_misses = 0
 
     def forward(
         self,
@@ -155,34 +1171,388 @@ class WebRAGTool(Tool):
             return "Please provide a 'question' string."
         urls = urls or []
         top_k = top_k or 4
-        for u in urls:
-            try:
-                self._ingest_url(u)
-            except Exception:
-                pass
-        hits = self.idx.search(question, top_k=top_k)
-        if not hits:
-            return "No context available yet; add URLs or content first."
+        if urls:
+            self.ingest_urls(urls)  # per-URL errors are recorded, not raised
+        return self.forward_batch([(question, top_k)])[0]
+
+    def forward_batch(self, items: List[Tuple[Optional[str], Optional[int]]]) -> List[str]:
+        """forward() for many (question, top_k) pairs in one index pass, results in order.
+
+        Cached answers are reused; the misses are scored together with
+        search_batch at the largest requested top_k (a top-k list is a prefix
+        of any longer one) while holding the index lock once.
+        """
+        out: List[Optional[str]] = [None] * len(items)
+        misses: Dict[tuple, List[int]] = {}
+        with self._index_lock.read():
+            generation = self.idx.generation
+            with self._answers_lock:
+                for i, (question, top_k) in enumerate(items):
+                    if not question:
+                        out[i] = "Please provide a 'question' string."
+                        continue
+                    # Any ingest/removal bumps the generation, so stale answers are never keyed.
+                    key = (tuple(sorted(_tokenize(question))), top_k or 4, generation)
+                    body = self._answers.get(key)
+                    if body is not None:
+                        self._answers.move_to_end(key)
+                        self.cache_hits += 1
+                        out[i] = body
+                    else:
+                        self.cache_misses += 1
+                        misses.setdefault(key, []).append(i)
+            if misses:
+                keys = list(misses)
+                queries = [items[misses[k][0]][0] for k in keys]
+                with span("search"):
+                    hits = self.idx.search_batch(queries, top_k=max(k[1] for k in keys))
+        if misses:
+            with span("format"), self._answers_lock:
+                for key, h in zip(keys, hits):
+                    body = self._format_hits(h[:key[1]])
+                    self._answers[key] = body
+                    for i in misses[key]:
+                        out[i] = body
+                while len(self._answers) > self.answer_cache_size:
+                    self._answers.popitem(last=False)
+        for i, (question, _) in enumerate(items):
+            if question:
+                out[i] = ("Top passages for: " + question + "\n" + out[i]) if out[i] else \
+                    "No context available yet; add URLs or content first."
+        return out
+
+    @staticmethod
+    def _format_hits(hits: List[Tuple[float, str, dict]]) -> str:
         bullets = []
         for score, passage, meta in hits:
             cite = meta.get("url", "N/A")
             # in rag_tool.py, build bullets:
             snippet = (passage[:220] + "…") if len(passage) > 220 else passage
             bullets.append(f"- score={score:.3f} | {snippet} (source: {cite})")
-        return "Top passages for: " + question + "\n" + "\n".join(bullets)
+        return "\n".join(bullets)
+
+    def cache_stats(self) -> dict:
+        with self._answers_lock:
+            total = self.cache_hits + self.cache_misses
+            return {
+                "entries": len(self._answers),
+                "hits": self.cache_hits,
+                "misses": self.cache_misses,
+                "hit_rate": round(self.cache_hits / total, 3) if total else 0.0,
+                "generation": self.idx.generation,
+            }
+
+    def approx_nbytes(self) -> int:
+        """O(1) estimate of memory_report()["total_bytes"], for gauges and budgets."""
+        return self.idx.approx_nbytes() + (self.dedup.approx_nbytes() if self.dedup is not None else 0)
+
+    def memory_report(self) -> dict:
+        """The index's memory_report() (plus dedup signatures), taken under the read lock.
+
+        Walks every chunk and posting list; use approx_nbytes() on hot paths.
+        """
+        with self._index_lock.read():
+            report = self.idx.memory_report()
+            if self.dedup is not None:
+                report["dedup_bytes"] = self.dedup.approx_nbytes()
+                report["total_bytes"] += report["dedup_bytes"]
+            return report
+
+    def dedup_stats(self) -> Optional[dict]:
+        if self.dedup is None:
+            return None
+        with self._index_lock.read():
+            return self.dedup.stats()
 
     def _ingest_url(self, url: str) -> int:
         if not url or url in self.seen_urls:
             return 0
-        html_or_text = _fetch_text(url)
-        # If we got HTML, extract; if we got plain text (Wikipedia REST), _extract will just clean whitespace fine.
-        text = _extract_text_from_html(html_or_text)
-        chunks = _chunk(text)
-        metas = [{"url": url, "chunk": i} for i in range(len(chunks))]
-        self.idx.add_documents(chunks, metas)
-        self.seen_urls.add(url)
+        chunks, metas = self._prepare(url, _fetch_text(url, self.fetch_cache))
+        return self._index(url, chunks, metas)
+
+    def _prepare(self, url: str, html_or_text: str) -> Tuple[List[str], List[dict]]:
+        return _prepare_page(url, html_or_text, self.stream_extract, self.max_page_bytes, self.max_page_words)
+
+    def _index(self, url: str, chunks: List[str], metas: List[dict]) -> int:
+        # Tokenize and sign before taking the write lock; only the index update holds it.
+        tokens = [_tokenize(c) for c in chunks]
+        tfs = [Counter(t) for t in tokens]
+        sigs = [self.dedup.signature(t) for t in tokens] if self.dedup is not None else []
+        self._presync_dedup()
+        with span("index"), self._index_lock.write():
+            if url in self.seen_urls:  # indexed by a concurrent ingest meanwhile
+                return 0
+            if self.dedup is not None:
+                keep = self._dedup(sigs)
+                chunks, metas, tfs = [chunks[i] for i in keep], [metas[i] for i in keep], [tfs[i] for i in keep]
+            self._record(url, self.idx.add_term_freqs(chunks, metas, tfs))
+            self.seen_urls.add(url)
         return len(chunks)
 
+    def _signatures(self, chunks: List[str]) -> list:
+        if self.dedup is None:
+            return []
+        return [self.dedup.signature(_tokenize(c)) for c in chunks]
+
+    def _live_signatures(self) -> Dict[int, Any]:
+        dead = self.idx.dead
+        return {i: self.dedup.signature(_tokenize(self.idx.texts[i]))
+                for i in range(len(self.idx.doc_lens)) if i not in dead}
+
+    def _install_signatures(self, sigs: Dict[int, Any], epoch: int):
+        self.dedup.clear()
+        for i, sig in sigs.items():
+            self.dedup.add(i, sig)
+        self._dedup_epoch = epoch
+
+    def _presync_dedup(self):
+        """Rebuild stale signatures (after load or compaction) under the read lock,
+        so the write lock is not held for an O(corpus) rebuild. Call without the lock."""
+        if self.dedup is None or self._dedup_epoch == self.idx.epoch:
+            return
+        with self._index_lock.read():
+            epoch = self.idx.epoch
+            sigs = self._live_signatures()
+        with self._index_lock.write():
+            # Chunks added meanwhile came through _dedup, which synced the signatures itself.
+            if self.idx.epoch == epoch and self._dedup_epoch != epoch:
+                self._install_signatures(sigs, epoch)
+
+    def _sync_dedup(self):
+        """Rebuild the signatures when doc ids moved (load, compaction). Caller holds the
+        write lock; _presync_dedup has normally done this already."""
+        if self._dedup_epoch != self.idx.epoch:
+            self._install_signatures(self._live_signatures(), self.idx.epoch)
+
+    def _dedup(self, sigs: list) -> List[int]:
+        """Positions of the chunks to index: those that near-duplicate neither a live
+        indexed chunk nor an earlier chunk of the batch. Their signatures are
+        registered under the doc ids the next add will assign, so the caller
+        must hold the write lock and add exactly those chunks.
+        """
+        self._sync_dedup()
+        dead = self.idx.dead
+        live = lambda d: d not in dead
+        next_id = len(self.idx.doc_lens)
+        keep = []
+        for i, sig in enumerate(sigs):
+            if self.dedup.find(sig, live) is None:
+                self.dedup.add(next_id, sig)
+                next_id += 1
+                keep.append(i)
+        self.dedup.checked += len(sigs)
+        self.dedup.dropped += len(sigs) - len(keep)
+        return keep
+
+    def _unchanged(self, old: List[int], chunks: List[str]) -> bool:
+        """True if the indexed chunks ``old`` of a page are what indexing ``chunks`` would give."""
+        if self.dedup is None:
+            return [self.idx.texts[i] for i in old] == chunks
+        kept = {self.idx.metas[i]["chunk"]: self.idx.texts[i] for i in old}
+        if not all(no < len(chunks) and chunks[no] == t for no, t in kept.items()):
+            return False
+        # Chunks dropped last time must still be duplicates of something live.
+        self._sync_dedup()
+        dead = self.idx.dead
+        return all(
+            self.dedup.find(self.dedup.signature(_tokenize(c)), lambda d: d not in dead) is not None
+            for no, c in enumerate(chunks) if no not in kept
+        )
+
+    def _record(self, url: str, doc_ids: range):
+        if self._url_docs is not None and self._url_docs_epoch == self.idx.epoch:
+            self._url_docs.setdefault(url, []).extend(doc_ids)
+
+    def _doc_ids(self, url: str) -> List[int]:
+        if self._url_docs is None or self._url_docs_epoch != self.idx.epoch:
+            url_docs: Dict[str, List[int]] = {}
+            for i, meta in enumerate(self.idx.metas):
+                if i not in self.idx.dead:
+                    url_docs.setdefault(meta.get("url"), []).append(i)
+            self._url_docs, self._url_docs_epoch = url_docs, self.idx.epoch
+        return self._url_docs.get(url, [])
+
+    def remove_url(self, url: str) -> int:
+        """Drop every chunk of ``url`` from the index; returns how many were removed."""
+        with self._index_lock.write():
+            doc_ids = self._doc_ids(url)
+            self._url_docs.pop(url, None)
+            self.seen_urls.discard(url)
+            return self.idx.remove_documents(doc_ids)
+
+    def compact(self) -> int:
+        """Drop tombstoned chunks from memory now; returns how many were dropped.
+
+        remove_url() compacts on its own once they pass idx.compact_ratio; this
+        is the explicit maintenance call, O(corpus) under the write lock.
+        """
+        with self._index_lock.write():
+            dropped = len(self.idx.dead)
+            self.idx.compact()
+            return dropped
+
+    def refresh_url(self, url: str) -> int:
+        """Re-fetch ``url`` (revalidating any cached copy) and replace its chunks if they changed.
+
+        Returns the number of chunks indexed, or 0 when the page is unchanged.
+        """
+        raw = _fetch_text(url, self.fetch_cache, revalidate=True)
+        chunks, metas = self._prepare(url, raw)
+        self._presync_dedup()
+        with self._index_lock.write():
+            old = self._doc_ids(url)
+            if url in self.seen_urls and self._unchanged(old, chunks):
+                return 0
+            self.remove_url(url)
+            return self._index(url, chunks, metas)
+
+    def refresh_urls(self, urls: Optional[List[str]] = None) -> dict:
+        out = {}
+        for u in urls or []:
+            try:
+                out[u] = self.refresh_url(u)
+            except Exception as e:
+                out[u] = f"error: {e}"
+        return out
+
+    async def aingest_urls(
+        self,
+        urls: Optional[List[str]] = None,
+        max_concurrency: int = INGEST_CONCURRENCY,
+        per_host: int = INGEST_PER_HOST,
+    ) -> dict:
+        """Concurrent ingest_urls: same result dict ({url: n_chunks | "error: ..."}).
+
+        Fetches run in worker threads under a per-host and a global semaphore
+        (host first, so pages waiting on a busy host hold no global slot);
+        extraction/chunking of a page runs in a thread after its fetch slot is
+        released, so it overlaps other pages' network I/O. Indexing also runs
+        in a thread, under the index write lock, so the event loop never
+        blocks on it and pages are still added one at a time.
+        """
+        urls = list(dict.fromkeys(urls or []))
+        total = asyncio.Semaphore(max(1, max_concurrency))
+        hosts: Dict[str, asyncio.Semaphore] = {}
+
+        async def one(url: str):
+            if not url or url in self.seen_urls:
+                return 0
+            host = hosts.setdefault(urlsplit(url).netloc, asyncio.Semaphore(max(1, per_host)))
+            async with host, total:
+                raw = await asyncio.to_thread(_fetch_text, url, self.fetch_cache)
+            chunks, metas = await asyncio.to_thread(self._prepare, url, raw)
+            if url in self.seen_urls:
+                return 0
+            return await asyncio.to_thread(self._index, url, chunks, metas)
+
+        results = await asyncio.gather(*(one(u) for u in urls), return_exceptions=True)
+        return {u: (f"error: {r}" if isinstance(r, BaseException) else r) for u, r in zip(urls, results)}
+
+    def save(self, path: str) -> str:
+        # One save at a time: a slower, older snapshot must not replace a newer file.
+        with self._save_lock:
+            # Only the snapshot holds the read lock; encoding and writing the file
+            # (O(corpus)) run without it, so a queued ingest never holds up /ask behind a save.
+            with self._index_lock.read():
+                snap = self.idx.snapshot()
+                seen_urls = sorted(self.seen_urls)
+                generation = self.idx.generation
+            out = snap.save(path, extra={"seen_urls": seen_urls})
+            self.saved_generation = generation
+            return out
+
+    @classmethod
+    def load(
+        cls,
+        path: str,
+        index_cls: type = BM25Index,
+        fetch_cache: Optional[FetchCache] = None,
+        dedup: bool = False,
+    ) -> "WebRAGTool":
+        idx, extra = index_cls._load_with_extra(path)
+        tool = cls(index=idx, fetch_cache=fetch_cache, dedup=dedup)
+        tool.seen_urls = set(extra.get("seen_urls", []))
+        tool.saved_generation = idx.generation
+        return tool
+
+    def ingest_pages(self, pages: Dict[str, str], processes: Optional[int] = None) -> dict:
+        """Extract, chunk and tokenize already-fetched pages in a process pool.
+
+        ``pages`` maps url -> raw HTML (or plain text). Workers return chunks and
+        term frequencies; the parent merges every page into the index in one
+        add_term_freqs call, in ``pages`` order, so the result is the same index
+        that serial ingest of those pages would build (near-duplicates included).
+        ``processes=0`` does the same work in this process. A page that fails
+        to prepare maps to ``"error: ..."``; the other pages are still indexed.
+        """
+        todo = [(u, html) for u, html in pages.items() if u and u not in self.seen_urls]
+        out = {u: 0 for u in pages}
+        if not todo:
+            return out
+        jobs = [(u, html, self.stream_extract, self.max_page_bytes, self.max_page_words) for u, html in todo]
+        all_chunks, all_metas, all_tfs = [], [], []
+        # Spans inside pool workers stay in those processes; "prepare" covers them here.
+        with span("prepare"):
+            if processes == 0:
+                prepared = list(map(_prepare_page_tf, jobs))
+            else:
+                with ProcessPoolExecutor(max_workers=processes) as pool:
+                    prepared = list(pool.map(_prepare_page_tf, jobs, chunksize=max(1, len(jobs) // 32)))
+        failed = set()
+        for (u, _), res in zip(todo, prepared):
+            if isinstance(res, str):
+                out[u] = res
+                failed.add(u)
+                continue
+            chunks, metas, tfs = res
+            all_chunks += chunks; all_metas += metas; all_tfs += tfs
+            out[u] = len(chunks)
+        if failed:
+            todo = [(u, html) for u, html in todo if u not in failed]
+        owner = [u for u, _ in todo for _ in range(out[u])]
+        sigs = self._signatures(all_chunks)
+        self._presync_dedup()
+        with span("index"), self._index_lock.write():
+            # A concurrent ingest may have indexed some of these pages since todo was built.
+            raced = {u for u, _ in todo if u in self.seen_urls}
+            keep = [i for i, u in enumerate(owner) if u not in raced] if raced else None
+            if self.dedup is not None:
+                keep = keep if keep is not None else range(len(owner))
+                keep = [keep[j] for j in self._dedup([sigs[i] for i in keep])]
+            if keep is not None:
+                todo = [(u, html) for u, html in todo if u not in raced]
+                out.update({u: 0 for u in owner})
+                for i in keep:
+                    out[owner[i]] += 1
+                all_chunks = [all_chunks[i] for i in keep]
+                all_metas = [all_metas[i] for i in keep]
+                all_tfs = [all_tfs[i] for i in keep]
+            start = self.idx.add_term_freqs(all_chunks, all_metas, all_tfs).start
+            for u, _ in todo:
+                self._record(u, range(start, start + out[u]))
+                start += out[u]
+            self.seen_urls.update(u for u, _ in todo)
+        return out
+
+    def ingest_urls_bulk(self, urls: Optional[List[str]] = None, processes: Optional[int] = None) -> dict:
+        """Fetch ``urls`` on threads, then hand the pages to ingest_pages()."""
+        urls = [u for u in dict.fromkeys(urls or []) if u]
+        todo = [u for u in urls if u not in self.seen_urls]
+        out: Dict[str, Any] = {u: 0 for u in urls}
+        pages = {}
+        with ThreadPoolExecutor(max_workers=INGEST_CONCURRENCY) as pool:
+            futures = {u: pool.submit(_fetch_text, u, self.fetch_cache) for u in todo}
+            for u, fut in futures.items():
+                try:
+                    pages[u] = fut.result()
+                except Exception as e:
+                    out[u] = f"error: {e}"
+        try:
+            out.update(self.ingest_pages(pages, processes=processes))
+        except Exception as e:
+            out.update({u: f"error: {e}" for u in pages})
+        return out
+
     # NEW: public method (no underscore)
     def ingest_url(self, url: str) -> int:
         return self._ingest_url(url)
@@ -190,6 +1560,11 @@ class WebRAGTool(Tool):
     # NEW: convenience for a list of URLs
     def ingest_urls(self, urls: Optional[List[str]] = None) -> dict:
         urls = urls or []
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.aingest_urls(urls))
+        # Already inside an event loop (async callers should await aingest_urls): go serial.
         out = {}
         for u in urls:
             try:
@@ -0,0 +1,186 @@
+# run_eval.py — run many scripted dialogues in parallel and time them.
+#
+#   python run_eval.py scenarios/ --out results/eval              # offline, process pool
+#   python run_eval.py scenarios/ --online --concurrency 8        # model + RAG server, asyncio
+#
+# A scenario file is JSON (one scenario or a list) or JSONL (one per line):
+#   {"name": "numeric_r3", "label": "Numeric r=3 (True)", "tau": 0.7,
+#    "dialogue": ["My goal is ...", ...],
+#    "pages": {"https://...": "text used for RAG when offline"}}
+# Each scenario gets results/<out>/<name>.jsonl in demo.py's format, which
+# `python aggregate_results.py results/<out>` summarises.
+import argparse, asyncio, json, os, re, time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, UTC
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from socratic_agent import SocraticController
+from tools import CheckNumericClaim
+from rag_tool import WebRAGTool
+from llm_cache import LLMCache
+from dialogue_rows import turn_row
+from metrics import percentile
+# Turns the controller answered with a caught exception ("[error during ASK: ...]", "[feedback error: ...]").
+_ERROR_TURN = re.compile(r"^\[(?:\w+ )?error\b")
+
+class OfflineRAGTool(WebRAGTool):
+    """web_rag over a scenario's local pages; URLs are never fetched."""
+
+    def forward(self, question: Optional[str] = None, urls: Optional[List[str]] = None, top_k: Optional[int] = 4) -> str:
+        return super().forward(question=question, urls=[], top_k=top_k)
+
+def load_scenarios(paths: List[str]) -> List[Dict[str, Any]]:
+    files: List[Path] = []
+    for p in map(Path, paths):
+        files += sorted(p.glob("*.json*")) if p.is_dir() else [p]
+    scenarios = []
+    for f in files:
+        text = f.read_text(encoding="utf-8")
+        if f.suffix == ".jsonl":
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            data = json.loads(text)
+            items = data if isinstance(data, list) else [data]
+        for i, sc in enumerate(items):
+            sc.setdefault("name", f.stem if len(items) == 1 else f"{f.stem}_{i}")
+            sc.setdefault("label", sc["name"])
+            scenarios.append(sc)
+    names = [sc["name"] for sc in scenarios]
+    dupes = sorted({n for n in names if names.count(n) > 1})
+    if dupes:
+        raise ValueError(f"duplicate scenario names: {dupes}")
+    return scenarios
+
+def _row(t: int, msg: str, out: Dict[str, Any], latency: float, ttft: Optional[float]) -> Dict[str, Any]:
+    row = turn_row(t, msg, out)
+    row["error"] = int(bool(_ERROR_TURN.match(row["text"])))
+    row["latency_s"] = round(latency, 4)
+    row["ttft_s"] = None if ttft is None else round(ttft, 4)
+    return row
+
+def _write(out_dir: str, scenario: Dict[str, Any], runtime: Dict[str, Any], rows: List[Dict[str, Any]]):
+    path = Path(out_dir) / f"{scenario['name']}.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"runtime": runtime}, ensure_ascii=False) + "\n")
+        for r in rows:
+            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+def _runtime(scenario: Dict[str, Any], ctrl: SocraticController) -> Dict[str, Any]:
+    return {
+        "timestamp": datetime.now(UTC).isoformat(),
+        "model": getattr(ctrl.model, "model_id", "unknown"),
+        "offline": ctrl.offline,
+        "tau": ctrl.tau,
+        "scenario": scenario["name"],
+        "label": scenario["label"],
+    }
+
+# --------------------------- offline: process pool ---------------------------
+
+def run_offline(scenario: Dict[str, Any], out_dir: str) -> Dict[str, Any]:
+    """One dialogue with a fresh offline controller; no network is touched."""
+    rag = OfflineRAGTool()
+    rag.ingest_pages(scenario.get("pages") or {}, processes=0)
+    ctrl = SocraticController(tau=scenario.get("tau", 0.7), offline=True, tools=[CheckNumericClaim(), rag])
+    rows = []
+    for t, msg in enumerate(scenario["dialogue"], 1):
+        t0 = time.perf_counter()
+        out = ctrl.step(msg) or {}
+        rows.append(_row(t, msg, out, time.perf_counter() - t0, None))
+        if rows[-1]["done"]:
+            break
+    _write(out_dir, scenario, _runtime(scenario, ctrl), rows)
+    return {"name": scenario["name"], "latencies": [r["latency_s"] for r in rows], "ttfts": [],
+            "error_turns": sum(r["error"] for r in rows)}
+
+# --------------------------- online: asyncio tasks ---------------------------
+
+async def run_online(scenario: Dict[str, Any], out_dir: str, base: SocraticController,
+                     limit: asyncio.Semaphore) -> Dict[str, Any]:
+    """One dialogue on a fork of ``base`` (shared model/tools, fresh state), streamed via astep."""
+    async with limit:
+        ctrl = base.fork()
+        ctrl.tau = scenario.get("tau", base.tau)
+        rows = []
+        for t, msg in enumerate(scenario["dialogue"], 1):
+            t0 = time.perf_counter()
+            ttft, out = None, {}
+            async for out in ctrl.astep(msg):
+                if ttft is None and out.get("partial"):
+                    ttft = time.perf_counter() - t0
+            rows.append(_row(t, msg, out or {}, time.perf_counter() - t0, ttft))
+            if rows[-1]["done"]:
+                break
+        ctrl.cancel_prefetch()
+    await asyncio.to_thread(_write, out_dir, scenario, _runtime(scenario, ctrl), rows)
+    return {"name": scenario["name"], "latencies": [r["latency_s"] for r in rows],
+            "ttfts": [r["ttft_s"] for r in rows if r["ttft_s"] is not None],
+            "error_turns": sum(r["error"] for r in rows)}
+
+async def _run_all_online(scenarios, out_dir: str, concurrency: int, llm_cache: Optional[LLMCache]):
+    base = SocraticController(offline=False, llm_cache=llm_cache)
+    limit = asyncio.Semaphore(max(1, concurrency))
+    return await asyncio.gather(*(run_online(sc, out_dir, base, limit) for sc in scenarios), return_exceptions=True)
+
+# --------------------------- report ---------------------------
+
+def _rounded_percentile(values: List[float], p: float) -> Optional[float]:
+    v = percentile(values, p)
+    return None if v is None else round(v, 4)
+
+def _latency_stats(values: List[float]) -> Dict[str, Any]:
+    return {"n": len(values), **{f"p{p}": _rounded_percentile(values, p) for p in (50, 90, 99)},
+            "max": round(max(values), 4) if values else None}
+
+def main(argv: Optional[List[str]] = None) -> Dict[str, Any]:
+    ap = argparse.ArgumentParser(description="Run scripted Socratic dialogues in parallel.")
+    ap.add_argument("scenarios", nargs="+", help="scenario files or directories of *.json / *.jsonl")
+    ap.add_argument("--out", default="results/eval", help="directory for per-scenario JSONL")
+    ap.add_argument("--online", action="store_true", help="use the model and RAG server (asyncio tasks)")
+    ap.add_argument("--workers", type=int, default=None, help="offline: processes (default: CPU count)")
+    ap.add_argument("--concurrency", type=int, default=8, help="online: dialogues in flight")
+    ap.add_argument("--llm-cache", default=os.environ.get("LLM_CACHE_DIR"), help="online: LLMCache directory")
+    args = ap.parse_args(argv)
+
+    scenarios = load_scenarios(args.scenarios)
+    os.makedirs(args.out, exist_ok=True)
+    t0 = time.perf_counter()
+    if args.online:
+        llm_cache = LLMCache(args.llm_cache) if args.llm_cache else None
+        results = asyncio.run(_run_all_online(scenarios, args.out, args.concurrency, llm_cache))
+    else:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = [pool.submit(run_offline, sc, args.out) for sc in scenarios]
+            results = []
+            for fut in futures:
+                try:
+                    results.append(fut.result())
+                except Exception as e:
+                    results.append(e)
+    wall = time.perf_counter() - t0
+
+    ok = [r for r in results if not isinstance(r, BaseException)]
+    failed = {sc["name"]: repr(r) for sc, r in zip(scenarios, results) if isinstance(r, BaseException)}
+    failed.update({r["name"]: f"{r['error_turns']} error turn(s)" for r in ok if r["error_turns"]})
+    latencies = [x for r in ok for x in r["latencies"]]
+    summary = {
+        "mode": "online" if args.online else "offline",
+        "scenarios": len(scenarios),
+        "failed": failed,
+        "turns": len(latencies),
+        "wall_s": round(wall, 3),
+        "dialogues_per_s": round(len(ok) / wall, 3) if wall else None,
+        "turns_per_s": round(len(latencies) / wall, 3) if wall else None,
+        "turn_latency_s": _latency_stats(latencies),
+    }
+    if args.online:
+        summary["ttft_s"] = _latency_stats([x for r in ok for x in r["ttfts"]])
+        if llm_cache:
+            summary["llm_cache"] = llm_cache.stats()
+    (Path(args.out) / "summary.json").write_text(json.dumps(summary, indent=2) + "\n")
+    print(json.dumps(summary, indent=2))
+    return summary
+
+if __name__ == "__main__":
+    main()
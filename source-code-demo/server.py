@@ -1,29 +1,186 @@
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
+from collections import OrderedDict
+import asyncio, os, time, uuid
 import uvicorn
 
-from rag_tool import WebRAGTool
+from rag_tool import WebRAGTool, INDEX_FILENAME
+from fetch_cache import FetchCache
+from rag_collections import CollectionManager
+import metrics
+
+# Set RAG_INDEX_DIR to keep the index across restarts (and share it between workers).
+INDEX_DIR = os.environ.get("RAG_INDEX_DIR")
+# Set RAG_FETCH_CACHE_DIR to cache fetched pages on disk (revalidated after the TTL).
+FETCH_CACHE_DIR = os.environ.get("RAG_FETCH_CACHE_DIR")
+FETCH_CACHE_MB = int(os.environ.get("RAG_FETCH_CACHE_MB", "256"))
+FETCH_CACHE_TTL = float(os.environ.get("RAG_FETCH_CACHE_TTL", str(24 * 3600)))
+# Set RAG_DEDUP=1 to drop near-duplicate chunks (mirrors, boilerplate) at ingest.
+DEDUP = os.environ.get("RAG_DEDUP", "") not in ("", "0")
+# Memory budget shared by the named collections (/collections/{name}/...).
+COLLECTIONS_BUDGET_MB = int(os.environ.get("RAG_COLLECTIONS_BUDGET_MB", "512"))
 
 app = FastAPI(title="Tiny Web RAG (BM25)")
-rag = WebRAGTool()
+fetch_cache = FetchCache(FETCH_CACHE_DIR, FETCH_CACHE_MB * 1024 * 1024, FETCH_CACHE_TTL) if FETCH_CACHE_DIR else None
+if INDEX_DIR and os.path.exists(os.path.join(INDEX_DIR, INDEX_FILENAME)):
+    rag = WebRAGTool.load(INDEX_DIR, fetch_cache=fetch_cache, dedup=DEDUP)
+else:
+    rag = WebRAGTool(fetch_cache=fetch_cache, dedup=DEDUP)
+collections = CollectionManager(
+    root=os.path.join(INDEX_DIR, "collections") if INDEX_DIR else None,
+    budget_bytes=COLLECTIONS_BUDGET_MB * 1024 * 1024,
+    fetch_cache=fetch_cache,
+    dedup=DEDUP,
+)
 
 class IngestBody(BaseModel):
     urls: List[str]
+    background: bool = False   # return a job id at once; poll GET /ingest/{job_id}
 
 class AskBody(BaseModel):
     question: Optional[str] = None   # ← make optional to match tool
     top_k: Optional[int] = 4
 
+class IngestAskBody(BaseModel):
+    question: Optional[str] = None
+    urls: List[str] = []
+    top_k: Optional[int] = 4
+
+class AskBatchBody(BaseModel):
+    items: List[AskBody]
+
+# Background ingest jobs, newest last; finished ones beyond MAX_JOBS are dropped, oldest first.
+MAX_JOBS = 256
+jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+async def _ingest_and_save(urls: List[str]) -> dict:
+    added = await rag.aingest_urls(urls)
+    if INDEX_DIR and any(isinstance(n, int) and n > 0 for n in added.values()):
+        await asyncio.to_thread(rag.save, INDEX_DIR)
+    return added
+
+async def _run_job(job: Dict[str, Any], urls: List[str]):
+    job["status"] = "running"
+    try:
+        job["added"] = await _ingest_and_save(urls)
+        job["status"] = "done"
+    except Exception as e:
+        job["status"], job["error"] = "error", str(e)
+    job["finished_at"] = time.time()
+    job.pop("_task", None)
+
 @app.post("/ingest")
-def ingest(body: IngestBody):
-    return {"added": rag.ingest_urls(body.urls)}
+async def ingest(body: IngestBody):
+    if not body.background:
+        return {"added": await _ingest_and_save(body.urls)}
+    job_id = uuid.uuid4().hex
+    job = {"job_id": job_id, "status": "queued", "urls": body.urls, "submitted_at": time.time()}
+    jobs[job_id] = job
+    # Drop the oldest finished jobs; running ones keep their entry (and _task reference).
+    finished = [k for k, j in jobs.items() if j["status"] in ("done", "error")]
+    for k in finished[:max(0, len(jobs) - MAX_JOBS)]:
+        del jobs[k]
+    job["_task"] = asyncio.create_task(_run_job(job, body.urls))  # keep a reference until it finishes
+    return {"job_id": job_id, "status": job["status"]}
+
+@app.get("/ingest/{job_id}")
+def ingest_status(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="unknown job id")
+    return {k: v for k, v in job.items() if not k.startswith("_")}
+
+@app.post("/refresh")
+def refresh(body: IngestBody):
+    refreshed = rag.refresh_urls(body.urls)
+    if INDEX_DIR and any(isinstance(n, int) and n > 0 for n in refreshed.values()):
+        rag.save(INDEX_DIR)
+    return {"refreshed": refreshed}
+
+@app.post("/remove")
+def remove(body: IngestBody):
+    removed = {u: rag.remove_url(u) for u in body.urls}
+    if INDEX_DIR and any(removed.values()):
+        rag.save(INDEX_DIR)
+    return {"removed": removed}
+
+@app.post("/compact")
+def compact():
+    """Maintenance: drop removed chunks from memory (O(corpus), blocks searches meanwhile)."""
+    return {"dropped": rag.compact()}
 
 @app.post("/ask")
 def ask(body: AskBody):
     answer = rag.forward(question=body.question, urls=[], top_k=body.top_k or 4)
     return {"context": answer}
 
+@app.post("/ingest_ask")
+async def ingest_ask(body: IngestAskBody):
+    """Ingest any unseen URLs, then answer the question, in one request."""
+    added = await _ingest_and_save(body.urls) if body.urls else {}
+    answer = await asyncio.to_thread(rag.forward, body.question, None, body.top_k or 4)
+    return {"added": added, "context": answer}
+
+@app.post("/ask_batch")
+def ask_batch(body: AskBatchBody):
+    contexts = rag.forward_batch([(item.question, item.top_k or 4) for item in body.items])
+    return {"contexts": contexts}
+
+def _check_collection(name: str) -> str:
+    try:
+        return CollectionManager.check_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/collections/{name}/ingest")
+async def collection_ingest(name: str, body: IngestBody):
+    # Loading a collection and evictions (which save indexes) run off the event loop.
+    async with collections.ause(_check_collection(name)) as tool:
+        added = await tool.aingest_urls(body.urls)
+        if INDEX_DIR and any(isinstance(n, int) and n > 0 for n in added.values()):
+            await asyncio.to_thread(collections.save, name)
+    return {"collection": name, "added": added}
+
+@app.post("/collections/{name}/ask")
+def collection_ask(name: str, body: AskBody):
+    with collections.use(_check_collection(name)) as tool:
+        answer = tool.forward(question=body.question, urls=[], top_k=body.top_k or 4)
+    return {"collection": name, "context": answer}
+
+@app.get("/collections")
+def collection_list():
+    return collections.stats()
+
+@app.get("/stats")
+def stats(detail: bool = False):
+    """Cache, index and stage stats; ``?detail=true`` adds the O(corpus) memory breakdown."""
+    index_memory = rag.memory_report() if detail else {
+        "chunks": len(rag.idx), "terms": len(rag.idx.vocab), "total_bytes": rag.approx_nbytes()}
+    return {
+        "answer_cache": rag.cache_stats(),
+        "index_memory": index_memory,
+        "fetch_cache": fetch_cache.stats() if fetch_cache else None,
+        "dedup": rag.dedup_stats(),
+        "stages": metrics.STAGE_SECONDS.snapshot(),
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    """Stage latency histograms and index size gauges, in the Prometheus text format."""
+    loaded = collections.stats()["loaded"]
+    lines = (
+        metrics.render_gauge("rag_index_documents", "Live chunks in the index.", {"default": len(rag.idx)})
+        + metrics.render_gauge("rag_index_terms", "Vocabulary size of the index.", {"default": len(rag.idx.vocab)})
+        + metrics.render_gauge("rag_index_bytes", "Approximate heap bytes of the index.", {"default": rag.approx_nbytes()})
+        + metrics.render_gauge("rag_collection_bytes", "Approximate heap bytes of each loaded collection.",
+                               loaded, label="collection")
+    )
+    cache = rag.cache_stats()
+    lines += metrics.render_gauge("rag_answer_cache_entries", "Formatted answers cached.", {"default": cache["entries"]})
+    return PlainTextResponse(metrics.render(lines), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,11 +1,14 @@
-from dataclasses import dataclass, field
-from typing import List, Dict, Any, Tuple
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Tuple, Optional
 from smolagents import CodeAgent, LiteLLMModel, InferenceClientModel
 from smolagents import ToolCallingAgent
 from tools import CheckNumericClaim
 from tools import HttpRAGTool 
+from llm_cache import LLMCache, CachedModel
+from metrics import collect, span
 
-import re
+import asyncio, contextvars, copy, re, threading, time, uuid
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
 
 SPEECH_ACTS = ["ASK", "CLARIFY", "PROBE", "CHALLENGE", "SUMMARIZE", "VERIFY"]
 @dataclass
@@ -31,6 +34,71 @@ class Ledger:
     confidence: float = 0.0
     open_questions: List[str] = field(default_factory=list)
 
+# Non-VERIFY turns containing any of these are replaced by a deflection (deference filter).
+DEFERENCE_PATTERNS = ["final answer", "therefore the answer", "the area is", "≈", "approximately"]
+# Streamed text held back so a pattern can't be half-shown before it is complete.
+_DEFERENCE_HOLDBACK = max(len(p) for p in DEFERENCE_PATTERNS) - 1
+
+def _deference_safe_prefix(text: str) -> Optional[str]:
+    """Part of a partial completion that may be shown now; None once the filter will fire."""
+    if any(p in text.lower() for p in DEFERENCE_PATTERNS):
+        return None
+    return text[:max(0, len(text) - _DEFERENCE_HOLDBACK)]
+
+# Used when a RAG[...] lesson names no URLs.
+DEFAULT_RAG_URLS = [
+    "https://en.wikipedia.org/wiki/Retrieval-augmented_generation",
+    "https://fastapi.tiangolo.com/",
+]
+
+class RetrievalPrefetcher:
+    """Runs web_rag calls in the background while the learner types.
+
+    Jobs are keyed by an id that the controller keeps in ``rag_flow`` (so the
+    state stays JSON-able); forked controllers share one prefetcher. A job
+    that has not started yet is cancelled outright; one already running
+    finishes in its thread and its result is dropped. Coroutine jobs
+    (start_async) are tasks on the given loop, and cancel() cancels the task.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._jobs: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def start(self, fn, *args, **kwargs) -> str:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="rag-prefetch")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = self._pool.submit(fn, *args, **kwargs)
+        return job_id
+
+    def take(self, job_id: Optional[str]) -> Optional[Future]:
+        """Hand a job over to its consumer (None if unknown or already cancelled)."""
+        with self._lock:
+            return self._jobs.pop(job_id, None) if job_id else None
+
+    def cancel(self, job_id: Optional[str]):
+        fut = self.take(job_id)
+        if fut is not None:
+            fut.cancel()
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def start_async(self, coro, loop: asyncio.AbstractEventLoop) -> str:
+        """start() for a coroutine, run as a task on ``loop``; take() still returns a Future."""
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._jobs[job_id] = asyncio.run_coroutine_threadsafe(coro, loop)
+        return job_id
+
+# Event loop of the astep() call whose turn is running; to_thread copies it into the worker.
+_astep_loop: "contextvars.ContextVar[Optional[asyncio.AbstractEventLoop]]" = contextvars.ContextVar(
+    "astep_loop", default=None)
+
 def _extract_hypothesis(msg: str) -> str:
     import re
     m = re.search(r"area of a circle with r\s*=\s*\d+(?:\.\d+)?\s*is\s*\d+(?:\.\d+)?", msg.lower())
@@ -64,7 +132,9 @@ def _parse_rag(msg: str):
 
 
 class SocraticController:
-    def __init__(self, model_backend="Qwen/Qwen2.5-7B-Instruct", tau=0.7, offline=True):
+    def __init__(self, model_backend="Qwen/Qwen2.5-7B-Instruct", tau=0.7, offline=True, model=None, tools=None,
+                 llm_cache: Optional[LLMCache] = None, cache_bypass: bool = False,
+                 prefetcher: Optional[RetrievalPrefetcher] = None, timings: bool = False):
         self.last_hypothesis = ""
         self.did_summarize = False
         self.tau = tau
@@ -72,18 +142,30 @@ class SocraticController:
         self.R = 0.0
         self.lrt = LRT()
         self.ledger = Ledger()
-        self.tools = [CheckNumericClaim()]
-        self.tools.append(HttpRAGTool(base_url="http://localhost:8000"))
+        if tools is not None:
+            self.tools = tools  # shared with other controllers (see fork)
+        else:
+            self.tools = [CheckNumericClaim()]
+            self.tools.append(HttpRAGTool(base_url="http://localhost:8000"))
+        self.model_backend = model_backend
         self.offline = offline
         self.rag_flow: Optional[Dict[str, Any]] = None
+        self.prefetcher = prefetcher if prefetcher is not None else RetrievalPrefetcher()
+        # timings: add {"timings": {stage: seconds, ..., "total": s}} to each step() result.
+        self.timings = timings
 
-        if not offline:
+        if model is not None:
+            self.model = model
+        elif not offline:
             self.model = InferenceClientModel(
                 model_id=model_backend,
                 #. provider="hf-inference",
             )
         else:
             self.model = None
+        if llm_cache is not None and self.model is not None:
+            # Repeated prompts (scripted runs, classrooms) are answered from disk.
+            self.model = CachedModel(self.model, llm_cache, bypass=cache_bypass)
 
     def _get_tool(self, name: str):
         for t in self.tools:
@@ -91,6 +173,46 @@ class SocraticController:
                 return t
         return None
 
+    # ------ per-learner state (everything but the model and tools) ------
+    def state_dict(self) -> Dict[str, Any]:
+        """Dialogue state as plain JSON-able data."""
+        return {
+            "s": self.s,
+            "R": self.R,
+            "last_hypothesis": self.last_hypothesis,
+            "did_summarize": self.did_summarize,
+            "ledger": asdict(self.ledger),
+            "lrt": {"nodes": [[n.kind, n.text] for n in self.lrt.nodes],
+                    "edges": [list(e) for e in self.lrt.edges]},
+            "rag_flow": dict(self.rag_flow) if self.rag_flow else None,
+        }
+
+    def load_state(self, state: Dict[str, Any]):
+        state = copy.deepcopy(state)  # the caller keeps its copy untouched
+        self.s = state.get("s", "EXPLORE")
+        self.R = state.get("R", 0.0)
+        self.last_hypothesis = state.get("last_hypothesis", "")
+        self.did_summarize = state.get("did_summarize", False)
+        self.ledger = Ledger(**state.get("ledger", {}))
+        lrt = state.get("lrt") or {}
+        self.lrt = LRT(nodes=[LRTNode(k, t) for k, t in lrt.get("nodes", [])],
+                       edges=[tuple(e) for e in lrt.get("edges", [])])
+        self.rag_flow = state.get("rag_flow") or None
+
+    def fork(self, state: Optional[Dict[str, Any]] = None) -> "SocraticController":
+        """A controller sharing this one's model and tools, with fresh (or the given) state."""
+        other = SocraticController(self.model_backend, tau=self.tau, offline=self.offline,
+                                   model=self.model, tools=self.tools, prefetcher=self.prefetcher,
+                                   timings=self.timings)
+        if state:
+            other.load_state(state)
+        return other
+
+    def cancel_prefetch(self):
+        """Drop the retrieval started for a pending RAG lesson (e.g. the session ended)."""
+        if self.rag_flow:
+            self.prefetcher.cancel(self.rag_flow.pop("prefetch", None))
+
     def readiness(self) -> float:
         coverage = 0.0
         coverage += 0.30 if self.ledger.goal else 0.0
@@ -147,10 +269,97 @@ class SocraticController:
             return f"Here’s your current state.\n{g}\n{c}\n{oq}"
         if act == "VERIFY":
             return "Running the minimal check..."
+        if act == "FEEDBACK":
+            return ("Check your draft against the snippets: is each claim backed by one of them (with its URL)? "
+                    "Pick the vaguest sentence and make it concrete.")
         return "Let’s continue."
 
 
+    def _generate(self, messages, max_tokens: int, stream: bool, event: Dict[str, Any], defer: bool = False):
+        """model.generate as a generator: yields partial events (``event`` plus the text
+        so far) while streaming, returns the stripped completion. With ``defer``,
+        partials only show text the deference filter has already cleared."""
+        generate_stream = getattr(self.model, "generate_stream", None)
+        with span("generate"):
+            if not stream or generate_stream is None:
+                resp = self.model.generate(messages, max_tokens=max_tokens, temperature=0.2)
+                return (resp.content or "").strip()
+            buf, shown, blocked = "", "", False
+            for delta in generate_stream(messages, max_tokens=max_tokens, temperature=0.2):
+                if not delta.content:
+                    continue
+                buf += delta.content
+                if blocked:
+                    continue
+                visible = buf.lstrip()
+                if defer:
+                    visible = _deference_safe_prefix(visible)
+                    if visible is None:
+                        blocked = True  # the filter will replace this turn; show nothing more
+                        continue
+                if visible and visible != shown:
+                    shown = visible
+                    yield dict(event, text=visible, partial=True)
+            return buf.strip()
+
+    def _timed(self, out, breakdown, t0: float):
+        if self.timings and isinstance(out, dict):
+            out["timings"] = breakdown.as_dict(total=time.perf_counter() - t0)
+        return out
+
     def step(self, learner_msg: str) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        with collect() as breakdown:
+            turn = self._turn(learner_msg, stream=False)
+            while True:
+                try:
+                    next(turn)
+                except StopIteration as done:
+                    return self._timed(done.value, breakdown, t0)
+
+    async def astep(self, learner_msg: str):
+        """Async step() that streams: yields partial results while the model generates
+        ({"partial": True, "act", "stance", "R", "text" so far}), then step()'s result.
+
+        The turn runs in a worker thread (tool calls and the model stream block);
+        closing the generator early stops it at the next token.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def run():
+            t0 = time.perf_counter()
+            _astep_loop.set(loop)  # to_thread runs us in a copy of the context; the caller's is untouched
+            turn = self._turn(learner_msg, stream=True)
+            try:
+                with collect() as breakdown:
+                    while not stop.is_set():
+                        try:
+                            event = next(turn)
+                        except StopIteration as done:
+                            final = self._timed(done.value, breakdown, t0)
+                            loop.call_soon_threadsafe(queue.put_nowait, ("final", final))
+                            return
+                        loop.call_soon_threadsafe(queue.put_nowait, ("partial", event))
+                    turn.close()
+            except BaseException as e:
+                loop.call_soon_threadsafe(queue.put_nowait, ("error", e))
+
+        worker = asyncio.ensure_future(asyncio.to_thread(run))
+        try:
+            while True:
+                kind, value = await queue.get()
+                if kind == "error":
+                    raise value
+                yield value
+                if kind == "final":
+                    break
+        finally:
+            stop.set()
+            await worker
+
+    def _turn(self, learner_msg: str, stream: bool = False):
         # ------ state updates (same as before) ------
         msg_low = learner_msg.lower()
         low = msg_low.lower()
@@ -159,7 +368,18 @@ class SocraticController:
         urls, topic = _parse_rag(learner_msg)
         if topic is not None:
             # Initialize a multi-turn RAG tutoring flow
-            self.rag_flow = {"phase": "ELICIT", "topic": topic, "urls": urls or [], "ctx": None}
+            self.cancel_prefetch()
+            self.rag_flow = {"phase": "ELICIT", "topic": topic, "urls": urls or list(DEFAULT_RAG_URLS), "ctx": None}
+            # Ingest + retrieve while the learner answers; the ELICIT turn picks it up.
+            rag = self._get_tool("web_rag")
+            loop, aforward = _astep_loop.get(), getattr(rag, "aforward", None)
+            if loop is not None and aforward is not None:
+                # Under astep the fetch is a task on the caller's loop, not a pool thread.
+                self.rag_flow["prefetch"] = self.prefetcher.start_async(
+                    aforward(question=topic, urls=self.rag_flow["urls"], top_k=4), loop)
+            elif rag:
+                self.rag_flow["prefetch"] = self.prefetcher.start(
+                    rag.forward, question=topic, urls=self.rag_flow["urls"], top_k=4)
             return {
                 "act": "ASK",
                 "stance": "EXPLORE",
@@ -183,12 +403,18 @@ class SocraticController:
                 rag = self._get_tool("web_rag")
                 # If no URLs provided, give sensible defaults
                 if not urls:
-                    urls = [
-                        "https://en.wikipedia.org/wiki/Retrieval-augmented_generation",
-                        "https://fastapi.tiangolo.com/",
-                    ]
+                    urls = list(DEFAULT_RAG_URLS)
                     self.rag_flow["urls"] = urls
-                ctx = rag.forward(question=topic, urls=urls, top_k=4) if rag else "RAG tool not available."
+                ctx = None
+                prefetched = self.prefetcher.take(self.rag_flow.pop("prefetch", None))
+                with span("retrieve"):
+                    if prefetched is not None:
+                        try:
+                            ctx = prefetched.result()  # usually done already; else wait for it
+                        except (Exception, CancelledError):  # CancelledError: its loop has closed
+                            ctx = None  # retry in the foreground below
+                    if ctx is None:
+                        ctx = rag.forward(question=topic, urls=urls, top_k=4) if rag else "RAG tool not available."
                 self.rag_flow["ctx"] = ctx
                 self.rag_flow["phase"] = "SYNTH"
 
@@ -226,8 +452,11 @@ class SocraticController:
                     {"role": "user", "content": f"Context snippets:\n{ctx}\n\nStudent draft:\n{learner_msg}"},
                 ]
                 try:
-                    resp = self.model.generate(messages, max_tokens=180, temperature=0.2)
-                    feedback = (resp.content or "").strip()
+                    event = {"act": "SUMMARIZE", "stance": "EXPLORE", "R": max(self.R, 0.65)}
+                    if self.offline:
+                        feedback = self._offline_generate("FEEDBACK", learner_msg)
+                    else:
+                        feedback = yield from self._generate(messages, 180, stream, event)
                 except Exception as e:
                     feedback = f"[feedback error: {e}]"
 
@@ -282,7 +511,8 @@ class SocraticController:
                 if act == "VERIFY":
                     # controller-driven tool check (no agent, no tool logs)
                     hyp_to_check = hyp or self.last_hypothesis or learner_msg
-                    finding = self.tools[0].forward(hypothesis=hyp_to_check)
+                    with span("verify"):
+                        finding = self.tools[0].forward(hypothesis=hyp_to_check)
                     text = f"Verification finding: {finding}"
                     self.lrt.nodes.append(LRTNode("evidence", text))
                     R_after = self.readiness()
@@ -299,8 +529,8 @@ class SocraticController:
                     {"role": "user", "content": f"[ACT={act}] User: {learner_msg}\nTutor:"},
                 ]
                 try:
-                    resp = self.model.generate(messages, max_tokens=128, temperature=0.2)  # <-- here
-                    text = (resp.content or "").strip()
+                    event = {"act": act, "R": self.R, "stance": self.s}
+                    text = yield from self._generate(messages, 128, stream, event, defer=True)  # <-- here
                 except Exception as e:
                     text = f"[error during {act}: {e}]"
         except Exception as e:
@@ -311,7 +541,8 @@ class SocraticController:
         done = False
         if act == "VERIFY":
             hyp_to_check = hyp or self.last_hypothesis or learner_msg
-            finding = self.tools[0].forward(hypothesis=hyp_to_check)
+            with span("verify"):
+                finding = self.tools[0].forward(hypothesis=hyp_to_check)
             text = f"Verification finding: {finding}"
             self.lrt.nodes.append(LRTNode("evidence", text))
 
@@ -322,7 +553,7 @@ class SocraticController:
         # ------ deference filter for non-VERIFY turns (belt & suspenders) ------
         if act != "VERIFY":
             lower = text.lower()
-            if any(p in lower for p in ["final answer", "therefore the answer", "the area is", "≈", "approximately"]):
+            if any(p in lower for p in DEFERENCE_PATTERNS):
                 text = "Let's not finalize yet. What criterion would convince you your idea works?"
 
         # ------ ALWAYS return a dict ------
@@ -0,0 +1,21 @@
+import os, random, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = [f"w{i}" for i in range(400)] + ["the", "a", "of"]
+WEIGHTS = [1.0 / (r + 1) for r in range(400)] + [2.0, 2.0, 1.0]
+
+@pytest.fixture(scope="session")
+def docs():
+    """1200 seeded chunks of Zipf-ish words, 3 to 200 words long."""
+    rng = random.Random(7)
+    return [" ".join(rng.choices(WORDS, WEIGHTS, k=rng.randint(3, 200))) for _ in range(1200)]
+
+@pytest.fixture(scope="session")
+def queries():
+    """200 seeded queries: 1-6 words, repeats and unknown terms included."""
+    rng = random.Random(8)
+    qs = [" ".join(rng.choices(WORDS + ["nosuchterm"], k=rng.randint(1, 6))) for _ in range(196)]
+    return qs + ["the a the", "w1 w1 w1 w2", "nosuchterm", ""]
@@ -0,0 +1,56 @@
+import random
+
+import pytest
+
+from rag_tool import BM25Index
+
+def _search_both(idx, queries, top_k):
+    out = []
+    for pruning in (True, False):
+        idx.pruning = pruning
+        out.append([idx.search(q, top_k) for q in queries])
+    del idx.pruning
+    return out
+
+@pytest.fixture
+def index(docs):
+    idx = BM25Index()
+    idx.add_documents(docs, [{"i": i} for i in range(len(docs))])
+    return idx
+
+@pytest.mark.parametrize("top_k", [1, 4, 20, 2000])
+def test_pruned_search_matches_exhaustive(index, queries, top_k):
+    pruned, exhaustive = _search_both(index, queries, top_k)
+    assert pruned == exhaustive
+    assert index.pruning_mismatches(queries, top_k) == []
+
+def test_pruned_search_matches_exhaustive_after_removal(index, docs, queries):
+    rng = random.Random(9)
+    index.remove_documents(rng.sample(range(len(docs)), 200))
+    assert index.dead  # tombstones are still in the postings
+    pruned, exhaustive = _search_both(index, queries, 4)
+    assert pruned == exhaustive
+    assert all(m["i"] not in index.dead for hits in pruned for _, _, m in hits)
+    index.remove_documents(rng.sample(range(len(index.doc_lens)), 300))
+    pruned, exhaustive = _search_both(index, queries, 4)
+    assert pruned == exhaustive
+
+def test_batch_search_matches_single_queries(index, queries):
+    single = [index.search(q, 4) for q in queries]
+    batch = index.search_batch(queries, 4)
+    assert [[m for _, _, m in hits] for hits in batch] == [[m for _, _, m in hits] for hits in single]
+    assert all(b[0] == pytest.approx(s[0]) for bh, sh in zip(batch, single) for b, s in zip(bh, sh))
+
+def test_approx_nbytes_tracks_memory_report(index, docs, tmp_path):
+    def close(idx):
+        return idx.approx_nbytes() == pytest.approx(idx.memory_report()["total_bytes"], rel=0.15)
+    assert close(index)
+    index.remove_documents(range(0, len(docs), 2))  # compacts
+    assert close(index)
+    index.add_documents(docs[:100])
+    assert close(index)
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    assert close(loaded)
+    loaded.add_documents(docs[:10])  # thaws onto the heap
+    assert close(loaded)
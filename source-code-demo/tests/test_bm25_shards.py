@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+from bm25_shards import ShardedBM25Index
+from rag_tool import BM25Index, WebRAGTool
+
+def _build(docs, n_shards=3):
+    single, sharded = BM25Index(), ShardedBM25Index(n_shards)
+    for i in range(0, len(docs), 170):
+        metas = [{"i": j} for j in range(i, min(i + 170, len(docs)))]
+        single.add_documents(docs[i:i + 170], metas)
+        sharded.add_documents(docs[i:i + 170], metas)
+    return single, sharded
+
+@pytest.fixture
+def pair(docs):
+    single, sharded = _build(docs)
+    yield single, sharded
+    sharded.close()
+
+@pytest.mark.parametrize("top_k", [1, 4, 20, 2000])
+def test_sharded_scores_match_single_index(pair, queries, top_k):
+    single, sharded = pair
+    assert sharded.search_batch(queries, top_k) == [single.search(q, top_k) for q in queries]
+
+def test_sharded_scores_match_after_removal(pair, docs, queries):
+    single, sharded = pair
+    rng = random.Random(9)
+    for _ in range(3):  # enough removals to make the single index and the shards compact
+        gone = rng.sample(range(len(docs)), 150)
+        assert sharded.remove_documents(gone) == single.remove_documents(
+            [i for i, m in enumerate(single.metas) if m["i"] in set(gone) and i not in single.dead])
+        assert len(sharded) == len(single)
+        assert sharded.search_batch(queries, 4) == [single.search(q, 4) for q in queries]
+    extra = docs[:50]
+    single.add_documents(extra, [{"i": len(docs) + j} for j in range(50)])
+    sharded.add_documents(extra, [{"i": len(docs) + j} for j in range(50)])
+    assert sharded.search_batch(queries, 4) == [single.search(q, 4) for q in queries]
+
+def test_sharded_remove_ignores_unknown_and_repeated_ids(pair):
+    _, sharded = pair
+    assert sharded.remove_documents([5, 5, -1, 10**9]) == 1
+    assert sharded.remove_documents([5]) == 0
+
+def test_web_rag_tool_refuses_sharded_index(pair):
+    with pytest.raises(TypeError):
+        WebRAGTool(index=pair[1])
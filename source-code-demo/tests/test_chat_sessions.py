@@ -0,0 +1,71 @@
+import threading
+
+import socratic_agent as sa
+from chat_sessions import SessionManager
+
+def test_end_during_a_step_drops_its_state_and_serialises_the_next(monkeypatch):
+    sessions = SessionManager(sa.SocraticController(offline=True))
+    sessions.step("s", "My goal is to check r=3")
+    started, release, order = threading.Event(), threading.Event(), []
+    step = sa.SocraticController.step
+
+    def slow_step(self, msg):
+        order.append(("start", msg))
+        if msg == "slow":
+            started.set()
+            release.wait(5)
+        out = step(self, msg)
+        order.append(("end", msg))
+        return out
+
+    monkeypatch.setattr(sa.SocraticController, "step", slow_step)
+    old = threading.Thread(target=sessions.step, args=("s", "slow"))
+    old.start()
+    assert started.wait(5)
+    sessions.end("s")
+    new = threading.Thread(target=sessions.step, args=("s", "fresh"))
+    new.start()
+    new.join(0.2)
+    assert new.is_alive()  # waits for the old step instead of running alongside it
+    release.set()
+    old.join(5); new.join(5)
+    assert order == [("start", "slow"), ("end", "slow"), ("start", "fresh"), ("end", "fresh")]
+    fresh = sa.SocraticController(offline=True)
+    fresh.step("fresh")
+    assert sessions._sessions["s"]["state"] == fresh.state_dict()  # the ended step's state was dropped
+    assert len(sessions) == 1 and not sessions._slots
+
+def test_end_stops_waiting_steps_and_keeps_their_lock(monkeypatch):
+    sessions = SessionManager(sa.SocraticController(offline=True))
+    started, release, running, overlaps, results = threading.Event(), threading.Event(), [], [], {}
+    step = sa.SocraticController.step
+
+    def slow_step(self, msg):
+        overlaps.append(len(running))
+        running.append(msg)
+        if msg == "slow":
+            started.set()
+            release.wait(5)
+        out = step(self, msg)
+        running.remove(msg)
+        return out
+
+    def run(msg):
+        results[msg] = sessions.step("s", msg)
+
+    monkeypatch.setattr(sa.SocraticController, "step", slow_step)
+    slow = threading.Thread(target=run, args=("slow",))
+    slow.start()
+    assert started.wait(5)
+    queued = threading.Thread(target=run, args=("queued",))
+    queued.start()
+    while sessions._slots["s"]["users"] < 2:
+        threading.Event().wait(0.01)
+    sessions.end("s")  # the queued step still holds a reference to the lock
+    late = threading.Thread(target=run, args=("late",))
+    late.start()
+    release.set()
+    for t in (slow, queued, late):
+        t.join(5)
+    assert results["queued"] is None and results["slow"] and results["late"]
+    assert overlaps == [0, 0] and not sessions._slots
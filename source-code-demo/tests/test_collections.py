@@ -0,0 +1,116 @@
+import asyncio, threading
+
+from rag_collections import CollectionManager
+from rag_tool import WebRAGTool
+
+def test_eviction_saves_only_changed_collections(tmp_path, monkeypatch, docs):
+    saves = []
+    save = WebRAGTool.save
+    monkeypatch.setattr(WebRAGTool, "save", lambda self, path: saves.append(path) or save(self, path))
+    cm = CollectionManager(root=str(tmp_path), budget_bytes=1)
+    with cm.use("a") as tool:
+        tool.ingest_pages({"https://example.org/1": docs[0]}, processes=0)
+    assert len(saves) == 1 and cm.evictions == 1
+    with cm.use("a") as tool:  # mapped back in, read only
+        assert tool.forward(question=docs[0][:40], urls=[])
+    assert len(saves) == 1 and cm.evictions == 2
+    with cm.use("a") as tool:
+        tool.ingest_pages({"https://example.org/2": docs[1]}, processes=0)
+    assert len(saves) == 2
+    with cm.use("a") as tool:
+        assert tool.seen_urls == {"https://example.org/1", "https://example.org/2"}
+
+def test_use_can_defer_budget_enforcement(tmp_path, docs):
+    cm = CollectionManager(root=str(tmp_path), budget_bytes=1)
+    with cm.use("a", enforce=False) as tool:
+        tool.ingest_pages({"https://example.org/1": docs[0]}, processes=0)
+    assert cm.evictions == 0 and cm.loaded_nbytes() > 1
+    cm.enforce_budget()
+    assert cm.evictions == 1 and cm.loaded_nbytes() == 0
+
+def test_use_revives_a_collection_during_its_eviction_save(tmp_path, monkeypatch, docs):
+    cm = CollectionManager(root=str(tmp_path), budget_bytes=1)
+    with cm.use("a", enforce=False) as tool:
+        tool.ingest_pages({"https://example.org/1": docs[0]}, processes=0)
+    saving, release = threading.Event(), threading.Event()
+    save = WebRAGTool.save
+
+    def slow_save(self, path):
+        saving.set()
+        release.wait(5)
+        return save(self, path)
+
+    monkeypatch.setattr(WebRAGTool, "save", slow_save)
+    evicting = threading.Thread(target=cm.enforce_budget)
+    evicting.start()
+    assert saving.wait(5)
+    with cm.use("a", enforce=False) as revived:
+        assert revived is tool
+        release.set()
+        evicting.join(5)
+        assert revived.forward(question=docs[0][:40], urls=[])
+    assert cm.stats()["loaded"].keys() == {"a"} and cm.evictions == 0
+
+def test_cold_load_does_not_block_other_collections(tmp_path, monkeypatch, docs):
+    cm = CollectionManager(root=str(tmp_path), budget_bytes=1)
+    for name in ("a", "b"):
+        with cm.use(name) as tool:  # saved and evicted on the way out
+            tool.ingest_pages({f"https://example.org/{name}": docs[0]}, processes=0)
+    loading, release, loads = threading.Event(), threading.Event(), []
+    load = WebRAGTool.load.__func__
+
+    def slow_load(cls, path, **kw):
+        loads.append(path)
+        if path.endswith("a"):
+            loading.set()
+            release.wait(5)
+        return load(cls, path, **kw)
+
+    monkeypatch.setattr(WebRAGTool, "load", classmethod(slow_load))
+    got = []
+    users = [threading.Thread(target=lambda: got.append(cm._acquire("a"))) for _ in range(2)]
+    for t in users:
+        t.start()
+    assert loading.wait(5)
+    with cm.use("b", enforce=False) as b:  # not stuck behind a's load
+        assert b.seen_urls == {"https://example.org/b"}
+    assert cm.stats()["loaded"].keys() == {"b"}
+    release.set()
+    for t in users:
+        t.join(5)
+    assert got[0] is got[1] and sum(p.endswith("a") for p in loads) == 1
+    assert cm._pins["a"] == 2
+
+def test_ause_pins_then_enforces_the_budget(tmp_path, docs):
+    cm = CollectionManager(root=str(tmp_path), budget_bytes=1)
+
+    async def ingest():
+        async with cm.ause("a") as tool:
+            tool.ingest_pages({"https://example.org/1": docs[0]}, processes=0)
+            cm.enforce_budget()
+            assert cm.evictions == 0  # pinned while in use
+
+    asyncio.run(ingest())
+    assert cm.evictions == 1 and cm.stats()["on_disk"] == ["a"]
+
+def test_failed_eviction_save_keeps_collections_loaded(tmp_path, monkeypatch, docs):
+    cm = CollectionManager(root=str(tmp_path), budget_bytes=1)
+    for name in ("a", "b"):
+        with cm.use(name, enforce=False) as tool:
+            tool.ingest_pages({f"https://example.org/{name}": docs[0]}, processes=0)
+    save = WebRAGTool.save
+
+    def failing_save(self, path):
+        if path.endswith("a"):
+            raise OSError("disk full")
+        return save(self, path)
+
+    monkeypatch.setattr(WebRAGTool, "save", failing_save)
+    cm.enforce_budget()  # does not raise; b is still evicted
+    stats = cm.stats()
+    assert stats["loaded"].keys() == {"a"} and stats["on_disk"] == ["b"]
+    assert (cm.evictions, cm.save_errors) == (1, 1) and not cm._unloading
+    assert cm.loaded_nbytes() == stats["loaded"]["a"] > 0
+    monkeypatch.setattr(WebRAGTool, "save", save)
+    cm.enforce_budget()
+    assert cm.stats()["on_disk"] == ["a", "b"] and cm.evictions == 2
@@ -0,0 +1,57 @@
+import pytest
+
+import rag_tool
+from rag_tool import WebRAGTool
+
+ORIGINAL, MIRROR = "https://example.org/original", "https://mirror.example.net/copy"
+
+@pytest.fixture
+def pages(docs):
+    """url -> text: an original, its mirror (one word added) and filler pages sharing no text with them."""
+    long, short = [d for d in docs if len(d.split()) > 150], [d for d in docs if len(d.split()) <= 150]
+    text = " ".join(long)[:20000]
+    out = {f"https://example.org/filler{i}": " ".join(short[i * 5:i * 5 + 5]) for i in range(5)}
+    out[ORIGINAL] = text
+    out[MIRROR] = "mirrored " + text
+    return out
+
+@pytest.fixture
+def fetch(pages, monkeypatch):
+    monkeypatch.setattr(rag_tool, "_fetch_text", lambda url, cache=None, revalidate=False: pages[url])
+
+def _ingest(tool, pages, *urls):
+    return tool.ingest_pages({u: pages[u] for u in urls}, processes=0)
+
+def test_mirror_is_dropped(pages, fetch):
+    tool = WebRAGTool(dedup=True)
+    added = _ingest(tool, pages, ORIGINAL)[ORIGINAL]
+    assert added > 1
+    assert tool.ingest_urls([MIRROR]) == {MIRROR: 0}
+    assert len(tool.idx) == added and MIRROR in tool.seen_urls
+    assert tool.dedup_stats()["dropped"] == added
+
+def test_refreshing_the_mirror_after_removing_the_original_indexes_it(pages, fetch):
+    tool = WebRAGTool(dedup=True)
+    added = _ingest(tool, pages, ORIGINAL, MIRROR)[ORIGINAL]
+    assert tool.refresh_url(MIRROR) == 0  # its chunks still duplicate live ones
+    assert tool.remove_url(ORIGINAL) == added
+    assert tool.refresh_url(MIRROR) == added
+    assert {m["url"] for m in tool.idx.metas} >= {MIRROR}
+    hits = tool.idx.search(pages[MIRROR][:200], 1)
+    assert hits[0][2]["url"] == MIRROR
+
+def test_dedup_survives_compaction_and_reload(pages, fetch, tmp_path):
+    fillers = [u for u in pages if "filler" in u]
+    tool = WebRAGTool(dedup=True)
+    _ingest(tool, pages, *fillers, ORIGINAL)
+    tool.remove_url(fillers[0])
+    epoch = tool.idx.epoch
+    assert tool.compact() > 0 and tool.idx.epoch > epoch  # the original's doc ids moved down
+    assert _ingest(tool, pages, MIRROR) == {MIRROR: 0}
+    assert _ingest(tool, pages, fillers[0])[fillers[0]] > 0  # removed, so not a duplicate
+    tool.save(str(tmp_path))
+    loaded = WebRAGTool.load(str(tmp_path), dedup=True)
+    assert MIRROR in loaded.seen_urls
+    loaded.remove_url(MIRROR)  # forget it was seen, then try again
+    n = len(loaded.idx)
+    assert loaded.ingest_urls([MIRROR]) == {MIRROR: 0} and len(loaded.idx) == n
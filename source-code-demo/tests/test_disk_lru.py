@@ -0,0 +1,24 @@
+from fetch_cache import FetchCache
+from llm_cache import LLMCache
+
+def test_fetch_cache_evicts_lru_and_persists(tmp_path):
+    cache = FetchCache(str(tmp_path), max_bytes=10, flush_interval=0)
+    cache.store("https://a", "aaaa", "https://a", {"ETag": "x"})
+    cache.store("https://b", "bbbb", "https://b")
+    assert cache.read("https://a") == "aaaa"  # b is now least recently used
+    cache.store("https://c", "cccc", "https://c")
+    assert cache.lookup("https://b") is None and cache.lookup("https://a")["etag"] == "x"
+    reopened = FetchCache(str(tmp_path), max_bytes=10)
+    assert reopened.read("https://a", revalidated=True) == "aaaa"
+    assert reopened.read("https://c") == "cccc"
+    assert reopened.stats()["entries"] == 2 and cache.stats()["evictions"] == 1
+
+def test_llm_caches_sharing_a_directory_merge(tmp_path):
+    one, two = LLMCache(str(tmp_path), flush_interval=0), LLMCache(str(tmp_path), flush_interval=0)
+    one.put("k1", "first", "m")
+    two.put("k2", "second", "m")  # each write merges in the other process's entries
+    one.put("k3", "third", "m")
+    assert one.get("k2") == "second" and two.get("k1") == "first"
+    assert one.get("k4") is None and one.get("k1", bypass=True) is None
+    assert one.stats() == {"entries": 3, "bytes": 16, "hits": 1, "misses": 1, "bypassed": 1,
+                           "hit_rate": 0.5, "evictions": 0}
@@ -0,0 +1,50 @@
+import asyncio, threading
+
+import socratic_agent as sa
+from tools import HttpRAGTool
+
+class _Model:
+    def generate(self, *args, **kwargs):
+        class Resp:
+            content = "feedback"
+        return Resp()
+
+class _Rag(HttpRAGTool):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def forward(self, question=None, urls=None, top_k=4):
+        self.calls.append(("forward", threading.current_thread().name))
+        return "sync context https://sync.example.org"
+
+    async def aforward(self, question=None, urls=None, top_k=4):
+        self.calls.append(("aforward", threading.current_thread().name))
+        return "async context https://async.example.org"
+
+def _controller(rag):
+    return sa.SocraticController(offline=False, model=_Model(), tools=[sa.CheckNumericClaim(), rag])
+
+def test_astep_prefetches_with_aforward_on_the_callers_loop():
+    rag = _Rag()
+
+    async def dialogue():
+        ctrl = _controller(rag)
+        async for _ in ctrl.astep("RAG: what is retrieval augmentation"):
+            pass
+        assert sa._astep_loop.get() is None  # the caller's context is left alone
+        async for out in ctrl.astep("I know it adds retrieved text to the prompt"):
+            pass
+        return out
+
+    out = asyncio.run(dialogue())
+    assert rag.calls == [("aforward", "MainThread")]
+    assert "https://async.example.org" in out["text"]
+
+def test_step_prefetches_with_forward_in_a_thread():
+    rag = _Rag()
+    ctrl = _controller(rag)
+    ctrl.step("RAG: what is retrieval augmentation")
+    out = ctrl.step("I know it adds retrieved text to the prompt")
+    assert [c[0] for c in rag.calls] == ["forward"] and rag.calls[0][1] != "MainThread"
+    assert "https://sync.example.org" in out["text"]
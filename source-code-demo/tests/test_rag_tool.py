@@ -0,0 +1,130 @@
+import threading
+
+import pytest
+
+from rag_tool import BM25Index, WebRAGTool, _extract_text_from_html, _iter_html_words
+
+PAGES = [
+    "<!doctype html><html><head><title>Photosynthesis</title><style>p {color: red}</style></head>"
+    "<body><h1>Photosynthesis</h1><p>Plants turn light, water &amp; CO<sub>2</sub> into sugar.</p>"
+    "<script>var x = '<p>not text</p>';</script><ul><li>Chlorophyll</li><li>Stomata</li></ul>"
+    "<!-- a comment --><p>Caf\u00e9 na\u00efve \u00fcber \u2014 \u65e5\u672c\u8a9e</p></body></html>",
+    "<div><p>unclosed <b>bold<p>next paragraph<br>line<noscript>hidden</noscript> tail",
+    "plain text, no markup at all",
+]
+
+def test_save_skips_tombstones_without_mutating(docs, queries, tmp_path):
+    idx = BM25Index()
+    idx.add_documents(docs, [{"i": i} for i in range(len(docs))])
+    idx.remove_documents(range(0, len(docs), 10))  # below compact_ratio: stays tombstoned
+    dead, epoch, generation = set(idx.dead), idx.epoch, idx.generation
+    idx.save(str(tmp_path))
+    assert (idx.dead, idx.epoch, idx.generation, len(idx.doc_lens)) == (dead, epoch, generation, len(docs))
+    loaded = BM25Index.load(str(tmp_path))
+    assert not loaded.dead and len(loaded) == len(idx)
+    assert [loaded.search(q, 5) for q in queries] == [idx.search(q, 5) for q in queries]
+
+def test_ingest_pages_rechecks_seen_urls_under_the_lock(docs):
+    tool = WebRAGTool()
+    page = {"https://example.org/1": docs[0] + " " + docs[1]}
+    presync = tool._presync_dedup
+    raced = []
+
+    def racing_presync():  # another ingest of the same page lands between the filter and the lock
+        presync()
+        tool._presync_dedup = presync
+        raced.append(tool.ingest_pages(page, processes=0))
+
+    tool._presync_dedup = racing_presync
+    out = tool.ingest_pages(page, processes=0)
+    assert raced[0]["https://example.org/1"] > 0
+    assert out == {"https://example.org/1": 0}
+    assert len(tool.idx) == raced[0]["https://example.org/1"]
+
+def test_forward_uses_pruning_with_exhaustive_ranking(docs, queries, monkeypatch):
+    pages = {f"https://example.org/{i}": docs[i] for i in range(200)}
+    pruned, exhaustive = WebRAGTool(), WebRAGTool()
+    for tool in (pruned, exhaustive):
+        tool.ingest_pages(pages, processes=0)
+    exhaustive.idx.pruning = False
+    calls = []
+    maxscore = BM25Index._maxscore_ids
+    monkeypatch.setattr(BM25Index, "_maxscore_ids", lambda self, *a: calls.append(a) or maxscore(self, *a))
+    qs = [q for q in queries if q]
+    assert [pruned.forward(question=q) for q in qs[:20]] == [exhaustive.forward(question=q) for q in qs[:20]]
+    items = [(q, 4) for q in qs[20:]]
+    assert pruned.forward_batch(items) == exhaustive.forward_batch(items)
+    multi = sum(len(set(q.split())) > 1 for q in qs)
+    assert len(calls) == multi > 0
+
+@pytest.mark.parametrize("html", PAGES + ["", "   \n\t "])
+def test_streamed_words_match_soup_text(html):
+    assert " ".join(_iter_html_words(html, feed_chars=7)) == _extract_text_from_html(html)
+
+@pytest.mark.parametrize("html", PAGES)
+def test_byte_budget_cuts_on_characters_and_tags(html):
+    full = list(_iter_html_words(html))
+    for max_bytes in range(len(html.encode("utf-8")) + 2):
+        words = list(_iter_html_words(html, max_bytes=max_bytes, feed_chars=7))
+        assert all("<" not in w and "\ufffd" not in w for w in words), (max_bytes, words)
+        if words:
+            assert words[:-1] == full[:len(words) - 1]
+            assert full[len(words) - 1].startswith(words[-1])
+
+def test_pooled_ingest_builds_the_serial_index(docs):
+    pages = {f"https://example.org/{i}": f"<p>{docs[i]}</p>" for i in range(40)}
+    serial, pooled = WebRAGTool(), WebRAGTool()
+    assert serial.ingest_pages(pages, processes=0) == pooled.ingest_pages(pages, processes=2)
+    a, b = serial.idx, pooled.idx
+    assert (a.terms, a.df, a.doc_lens, a.texts, a.metas) == (b.terms, b.df, b.doc_lens, b.texts, b.metas)
+    assert [bytes(p) for p in a.postings] == [bytes(p) for p in b.postings]
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_failing_page_does_not_sink_the_batch(docs, processes):
+    tool = WebRAGTool()
+    out = tool.ingest_pages({"https://example.org/1": docs[0], "https://example.org/bad": 42,
+                             "https://example.org/2": docs[1]}, processes=processes)
+    assert out["https://example.org/bad"].startswith("error: ")
+    assert out["https://example.org/1"] > 0 and out["https://example.org/2"] > 0
+    assert tool.seen_urls == {"https://example.org/1", "https://example.org/2"}
+    assert len(tool.idx) == out["https://example.org/1"] + out["https://example.org/2"]
+
+def test_tool_save_leaves_compaction_to_compact(docs, tmp_path):
+    tool = WebRAGTool()
+    tool.ingest_pages({f"https://example.org/{i}": docs[i] for i in range(20)}, processes=0)
+    removed = tool.remove_url("https://example.org/3")
+    assert 0 < removed and len(tool.idx.dead) == removed  # below compact_ratio
+    tool.save(str(tmp_path))
+    assert len(tool.idx.dead) == removed
+    assert len(WebRAGTool.load(str(tmp_path)).idx) == len(tool.idx)
+    assert tool.compact() == removed and not tool.idx.dead
+    assert tool.forward(question=docs[4][:60]) == WebRAGTool.load(str(tmp_path)).forward(question=docs[4][:60])
+
+def test_tool_save_writes_a_snapshot_outside_the_lock(docs, tmp_path, monkeypatch):
+    tool = WebRAGTool()
+    tool.ingest_pages({f"https://example.org/{i}": docs[i] for i in range(10)}, processes=0)
+    tool.remove_url("https://example.org/2")
+    expected = tool.forward(question=docs[5][:60])
+    save, ingests = BM25Index.save, []
+
+    def save_during_ingest(snap, path, extra=None):
+        # An ingest needs the write lock; it must not wait for the file write.
+        t = threading.Thread(target=lambda: ingests.append(
+            tool.ingest_pages({"https://example.org/late": docs[20]}, processes=0)))
+        t.start()
+        t.join(5)
+        assert not t.is_alive() and snap is not tool.idx
+        return save(snap, path, extra)
+
+    monkeypatch.setattr(BM25Index, "save", save_during_ingest)
+    tool.save(str(tmp_path))
+    loaded = WebRAGTool.load(str(tmp_path))
+    assert "https://example.org/late" in tool.seen_urls and "https://example.org/late" not in loaded.seen_urls
+    assert loaded.forward(question=docs[5][:60]) == expected
+    assert tool.saved_generation < tool.idx.generation  # the late ingest is not in the file
+
+def test_stray_less_than_does_not_hold_back_text():
+    text = "if a < b then " + " ".join(f"w{i}" for i in range(5000))
+    words = list(_iter_html_words(text, max_bytes=len(text) - 100, feed_chars=1000))
+    assert len(words) > 4900
+    assert " ".join(_iter_html_words(text, feed_chars=1000)) == _extract_text_from_html(text)
@@ -0,0 +1,33 @@
+import asyncio
+from types import SimpleNamespace
+
+import socratic_agent as sa
+
+LEAD = "Good, you have named the inputs. Before we go on, let me ask about the light. So the "
+DELTAS = [LEAD[i:i + 9] for i in range(0, len(LEAD), 9)] + ["fin", "al ans", "wer is sugar", "."]
+
+class _StreamingModel:
+    def generate(self, *args, **kwargs):
+        return SimpleNamespace(content="".join(DELTAS))
+
+    def generate_stream(self, *args, **kwargs):
+        for d in DELTAS:
+            yield SimpleNamespace(content=d)
+
+def _controller():
+    return sa.SocraticController(offline=False, model=_StreamingModel(), tools=[sa.CheckNumericClaim()])
+
+def test_astep_never_streams_a_deference_phrase_split_across_chunks():
+    ctrl = _controller()
+
+    async def turn():
+        return [out async for out in ctrl.astep("I think plants need light to grow")]
+
+    events = asyncio.run(turn())
+    partials, final = [e for e in events if e.get("partial")], events[-1]
+    assert partials and not final.get("partial") and final["act"] != "VERIFY"
+    for e in partials:
+        assert LEAD.startswith(e["text"])  # nothing past the lead-in: not even "fin"
+        assert not any(p in e["text"].lower() for p in sa.DEFERENCE_PATTERNS)
+    assert "final answer" not in final["text"].lower()
+    assert final["text"] == _controller().step("I think plants need light to grow")["text"]  # the deflection
@@ -1,7 +1,9 @@
 from smolagents import Tool
+import asyncio
 import math
 import re
 import requests
+import requests.adapters
 from typing import Optional, List, Dict, Any
 
 class CheckNumericClaim(Tool):
@@ -36,26 +38,44 @@ class HttpRAGTool(Tool):
     }
     output_type = "string"
 
-    def __init__(self, base_url: str = "http://localhost:8000"):
+    def __init__(self, base_url: str = "http://localhost:8000", pool_size: int = 8):
         super().__init__()
         self.base_url = base_url.rstrip("/")
+        # One keep-alive session: ingest and ask reuse the same TCP connection.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        r = self.session.post(f"{self.base_url}{path}", json=payload, timeout=30)
+        r.raise_for_status()
+        return r.json()
 
     def _ingest_urls(self, urls: Optional[List[str]] = None) -> Dict[str, Any]:
         urls = urls or []
         if not urls:
             return {}
-        r = requests.post(f"{self.base_url}/ingest", json={"urls": urls}, timeout=30)
-        r.raise_for_status()
-        return r.json().get("added", {})
+        return self._post("/ingest", {"urls": urls}).get("added", {})
 
     def forward(self, question: Optional[str] = None, urls: Optional[List[str]] = None, top_k: Optional[int] = 4) -> str:
-        if urls:
-            try:
-                self._ingest_urls(urls)
-            except Exception:
-                pass
         if not question:
+            if urls:
+                try:
+                    self._ingest_urls(urls)
+                except Exception:
+                    pass
             return "Please provide a 'question'."
-        r = requests.post(f"{self.base_url}/ask", json={"question": question, "top_k": top_k or 4}, timeout=30)
-        r.raise_for_status()
-        return r.json().get("context", "")
\ No newline at end of file
+        if urls:
+            # Server ingests whatever it has not seen yet, then answers: one round trip.
+            return self._post("/ingest_ask", {"question": question, "urls": urls, "top_k": top_k or 4}).get("context", "")
+        return self._post("/ask", {"question": question, "top_k": top_k or 4}).get("context", "")
+
+    async def aforward(self, question: Optional[str] = None, urls: Optional[List[str]] = None, top_k: Optional[int] = 4) -> str:
+        """forward() without blocking the event loop (runs on the pooled session in a thread)."""
+        return await asyncio.to_thread(self.forward, question, urls, top_k)
+
+    def forward_batch(self, questions: List[str], top_k: Optional[int] = 4) -> List[str]:
+        """Ask many questions in one /ask_batch round trip; contexts come back in order."""
+        items = [{"question": q, "top_k": top_k or 4} for q in questions]
+        return self._post("/ask_batch", {"items": items}).get("contexts", [])